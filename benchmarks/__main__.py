@@ -0,0 +1,158 @@
+""" times each stage of the decompiler on synthetic listings of different shapes and on real listings
+
+usage: python -m benchmarks [--shape SHAPE ...] [--scale X] [--json out.json] [--compare old.json] [file ...]"""
+import argparse
+import json
+import platform
+import sys
+import tracemalloc
+from pathlib import Path
+from time import perf_counter
+
+from dis2py.dis2py import (
+	asts_to_code, dis_to_instructions, get_flags, instructions_to_asts, split_funcs, strip_comments
+)
+from . import synthetic
+
+# shape -> (generator, default size)
+SHAPES = {
+	"straight": (synthetic.straight_line, 20000),
+	"expression": (synthetic.long_expression, 5000),
+	"nested": (lambda depth: synthetic.nested_blocks(depth, width=4), 200),
+	"comprehensions": (synthetic.comprehensions, 2000),
+	"literals": (synthetic.big_literals, 20000),
+	"functions": (synthetic.many_functions, 2000),
+}
+STAGES = ("split_funcs", "dis_to_instructions", "instructions_to_asts", "asts_to_code")
+SAMPLES = Path(__file__).resolve().parent.parent / "samples"
+
+def run_stages(disasm, flags=0):
+	""" runs every stage over disasm once, returning {stage: seconds} and the number of functions and instructions"""
+	seconds = {}
+	start = perf_counter()
+	funcs = list(split_funcs(disasm))
+	seconds["split_funcs"] = perf_counter() - start
+	
+	start = perf_counter()
+	instructions = [(name, dis_to_instructions(func)) for name, func in funcs]
+	seconds["dis_to_instructions"] = perf_counter() - start
+	
+	start = perf_counter()
+	asts = [(instructions_to_asts(func, get_flags(name) | flags)[0], get_flags(name) | flags) for name, func in instructions]
+	seconds["instructions_to_asts"] = perf_counter() - start
+	
+	start = perf_counter()
+	for func_asts, func_flags in asts:
+		asts_to_code(func_asts, func_flags)
+	seconds["asts_to_code"] = perf_counter() - start
+	return seconds, len(funcs), sum(len(func) for _, func in instructions)
+
+def peak_memory(disasm, flags=0):
+	""" returns {stage: peak bytes allocated while running it}"""
+	peaks = {}
+	tracemalloc.start()
+	funcs = list(split_funcs(disasm))
+	peaks["split_funcs"] = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	
+	tracemalloc.start()
+	instructions = [(name, dis_to_instructions(func)) for name, func in funcs]
+	peaks["dis_to_instructions"] = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	
+	tracemalloc.start()
+	asts = [(instructions_to_asts(func, get_flags(name) | flags)[0], get_flags(name) | flags) for name, func in instructions]
+	peaks["instructions_to_asts"] = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	
+	tracemalloc.start()
+	for func_asts, func_flags in asts:
+		asts_to_code(func_asts, func_flags)
+	peaks["asts_to_code"] = tracemalloc.get_traced_memory()[1]
+	tracemalloc.stop()
+	return peaks
+
+def benchmark(name, disasm, repeat):
+	disasm = strip_comments(disasm)
+	best = {}
+	for _ in range(repeat):
+		seconds, num_funcs, num_instructions = run_stages(disasm)
+		for stage, elapsed in seconds.items():
+			best[stage] = min(elapsed, best.get(stage, elapsed))
+	peaks = peak_memory(disasm)
+	stages = {}
+	for stage in STAGES:
+		stages[stage] = {
+			"seconds": best[stage],
+			"instructions_per_second": num_instructions / best[stage] if best[stage] else None,
+			"peak_memory": peaks[stage],
+		}
+	total = sum(best.values())
+	return {
+		"name": name,
+		"bytes": len(disasm),
+		"functions": num_funcs,
+		"instructions": num_instructions,
+		"stages": stages,
+		"total": {
+		"seconds": total,
+		"instructions_per_second": num_instructions / total if total else None,
+		"peak_memory": max(peaks.values()),
+		},
+	}
+
+def print_result(result, baseline=None):
+	print(
+		f"{result['name']}: {result['functions']} functions, {result['instructions']} instructions, "
+		f"{result['bytes'] / 1024:.0f} KiB"
+	)
+	for stage in STAGES + ("total", ):
+		stats = result[stage] if stage == "total" else result["stages"][stage]
+		rate = stats["instructions_per_second"]
+		line = (
+			f"  {stage:<22}{stats['seconds'] * 1000:10.2f} ms"
+			f"{'-' if rate is None else f'{rate:,.0f}':>16} instr/s"
+			f"{stats['peak_memory'] / 1024 / 1024:10.2f} MiB peak"
+		)
+		if baseline is not None:
+			old = baseline[stage] if stage == "total" else baseline["stages"].get(stage)
+			if old and stats["seconds"]:
+				line += f"  {old['seconds'] / stats['seconds']:6.2f}x"
+		print(line)
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks each stage of dis2py.")
+	parser.add_argument("files", nargs="*", type=Path, help="real listings to benchmark (default: samples/)")
+	parser.add_argument("-s", "--shape", action="append", choices=SHAPES, help="synthetic shapes to run (default: all)")
+	parser.add_argument("--scale", type=float, default=1, help="multiplies the default size of every shape")
+	parser.add_argument("-r", "--repeat", type=int, default=3)
+	parser.add_argument("--json", help="also write the results as JSON to this file, - for stdout")
+	parser.add_argument("--compare", type=Path, help="JSON from a previous run to show speedups against")
+	args = parser.parse_args()
+	
+	baseline = {}
+	if args.compare is not None:
+		baseline = {result["name"]: result for result in json.loads(args.compare.read_text())["results"]}
+	inputs = []
+	for shape in args.shape or SHAPES:
+		generate, size = SHAPES[shape]
+		size = max(1, int(size * args.scale))
+		inputs.append((f"{shape}[{size}]", generate(size)))
+	for path in args.files or sorted(SAMPLES.glob("*.txt")):
+		inputs.append((path.name, path.read_text()))
+	
+	results = []
+	for name, disasm in inputs:
+		result = benchmark(name, disasm, args.repeat)
+		results.append(result)
+		if args.json != "-":
+			print_result(result, baseline.get(name))
+	if args.json is not None:
+		report = json.dumps({"python": platform.python_version(), "results": results}, indent=1)
+		if args.json == "-":
+			print(report)
+		else:
+			Path(args.json).write_text(report)
+
+if __name__ == "__main__":
+	sys.exit(main())
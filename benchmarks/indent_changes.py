@@ -0,0 +1,24 @@
+""" microbenchmark for the indentation bookkeeping in instructions_to_asts, using functions with
+hundreds of nested ifs and loops (so hundreds of dedents are pending at once)
+
+usage: python -m benchmarks.indent_changes [depth ...]"""
+import sys
+from timeit import Timer
+
+from dis2py.dis2py import dis_to_instructions, instructions_to_asts
+from .synthetic import nested_blocks
+
+def main():
+	depths = [int(arg) for arg in sys.argv[1:]] or [100, 200, 400, 800]
+	for depth in depths:
+		instructions = dis_to_instructions(nested_blocks(depth, width=4))
+		timer = Timer(lambda: instructions_to_asts(instructions))  # pylint: disable=cell-var-from-loop
+		number, _ = timer.autorange()
+		best = min(timer.repeat(3, number)) / number
+		print(
+			f"depth {depth:>5}: {len(instructions):>7} instructions, {best * 1000:8.2f} ms, "
+			f"{len(instructions) / best:12,.0f} instructions/s"
+		)
+
+if __name__ == "__main__":
+	main()
@@ -0,0 +1,79 @@
+""" measures how long importing dis2py and running its CLI take to start up, in fresh interpreters
+
+usage: python -m benchmarks.startup [--repeat N] [--top N] [--json out.json]"""
+import argparse
+import json
+import os
+import platform
+import re
+import subprocess
+import sys
+from pathlib import Path
+from time import perf_counter
+
+ROOT = Path(__file__).resolve().parent.parent
+SAMPLE = ROOT / "samples" / "C1cipher.txt"
+# scenario -> python arguments. Each one prints something once it's ready
+SCENARIOS = {
+	"import dis2py": ["-c", "import dis2py; print()"],
+	"import pretty_decompile": ["-c", "from dis2py import pretty_decompile; print()"],
+	"cli": ["-m", "dis2py", str(SAMPLE)],
+}
+_importtime_re = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \| ( *)(\S+)$", re.MULTILINE)
+
+def child_env():
+	env = dict(os.environ)
+	# so that the warm up run leaves .pyc files behind, like an installed package has
+	env.pop("PYTHONDONTWRITEBYTECODE", None)
+	env["PYTHONPATH"] = os.pathsep.join(filter(None, (str(ROOT), env.get("PYTHONPATH"))))
+	return env
+
+def time_to_output(args, env):
+	""" runs python with args, returning the seconds until its first byte of output and until it exits"""
+	start = perf_counter()
+	process = subprocess.Popen([sys.executable, *args], stdout=subprocess.PIPE, env=env, cwd=ROOT)
+	process.stdout.read(1)
+	first_output = perf_counter() - start
+	process.stdout.read()
+	process.wait()
+	return first_output, perf_counter() - start
+
+def import_times(args, env):
+	""" runs python -X importtime with args, returning [(module, self µs, cumulative µs)]
+	for the modules imported at the top level"""
+	result = subprocess.run(
+		[sys.executable, "-X", "importtime", *args], capture_output=True, text=True, env=env, cwd=ROOT
+	)
+	return [
+		(name, int(self_time), int(cumulative)) for self_time, cumulative, indent, name in
+		_importtime_re.findall(result.stderr) if not indent
+	]
+
+def main():
+	parser = argparse.ArgumentParser(description="Benchmarks the startup time of dis2py.")
+	parser.add_argument("-r", "--repeat", type=int, default=20)
+	parser.add_argument("--top", type=int, default=8, help="number of slowest imports to show")
+	parser.add_argument("--json", help="also write the results as JSON to this file")
+	args = parser.parse_args()
+	env = child_env()
+	
+	results = []
+	for name, scenario_args in SCENARIOS.items():
+		time_to_output(scenario_args, env)  # warm up
+		runs = [time_to_output(scenario_args, env) for _ in range(args.repeat)]
+		imports = sorted(import_times(scenario_args, env), key=lambda entry: -entry[2])
+		results.append({
+			"name": name,
+			"first_output": min(first_output for first_output, _ in runs),
+			"exit": min(exit_time for _, exit_time in runs),
+			"imports": [{"module": module, "self_us": self_time, "cumulative_us": cumulative} for module, self_time, cumulative in imports],
+		})
+		result = results[-1]
+		print(f"{name}: first output after {result['first_output'] * 1000:.1f} ms, exits after {result['exit'] * 1000:.1f} ms")
+		for module, self_time, cumulative in imports[:args.top]:
+			print(f"  {module:<32}{cumulative / 1000:8.1f} ms")
+	if args.json is not None:
+		Path(args.json).write_text(json.dumps({"python": platform.python_version(), "results": results}, indent=1))
+
+if __name__ == "__main__":
+	sys.exit(main())
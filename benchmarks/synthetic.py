@@ -0,0 +1,216 @@
+""" generates synthetic dis.dis listings (in the CPython 3.8 format dis2py understands)"""
+from itertools import count
+
+class Label:
+	pass
+
+class Assembler:
+	""" collects instructions for one function and formats them like dis.dis does"""
+	def __init__(self):
+		self.instructions = []  # [line_num, opname, arg, argrepr]
+		self.labels = {}  # Label -> index of the instruction it points to
+		self.line_num = 0
+	
+	def line(self, line_num=None):
+		""" starts a new source line"""
+		self.line_num = self.line_num + 1 if line_num is None else line_num
+	
+	def emit(self, opname, arg=None, argrepr=""):
+		self.instructions.append([self.line_num, opname, arg, argrepr])
+	
+	def mark(self, label):
+		self.labels[label] = len(self.instructions)
+	
+	def format(self):
+		# every instruction is 2 bytes, so labels can be resolved once all instructions are known
+		targets = {2 * index for index in self.labels.values()}
+		line_num_width = max(3, len(str(self.line_num)))
+		offset_width = max(4, len(str(2 * len(self.instructions) - 2)))
+		lines = []
+		prev_line_num = None
+		for index, (line_num, opname, arg, argrepr) in enumerate(self.instructions):
+			offset = 2 * index
+			if isinstance(arg, Label):
+				target = 2 * self.labels[arg]
+				if opname in ("FOR_ITER", "JUMP_FORWARD"):
+					arg, argrepr = target - offset - 2, f"to {target}"
+				else:
+					arg = target
+			fields = []
+			if line_num != prev_line_num:
+				if prev_line_num is not None:
+					lines.append("")
+				fields.append(str(line_num).rjust(line_num_width))
+				prev_line_num = line_num
+			else:
+				fields.append(" " * line_num_width)
+			fields.append("   ")
+			fields.append(">>" if offset in targets else "  ")
+			fields.append(str(offset).rjust(offset_width))
+			fields.append(opname.ljust(20))
+			if arg is not None:
+				fields.append(f"{arg:>5}")
+				if argrepr:
+					fields.append(f"({argrepr})")
+			lines.append(" ".join(fields).rstrip())
+		return "\n".join(lines) + "\n"
+
+def nested_blocks(depth, width=1):
+	""" a function made of `width` copies of `depth` alternately nested for loops and ifs:
+
+	def nested(a, b):
+		for i2 in a:
+			if i2:
+				for i3 in a:
+					...
+						b += 1
+		return b
+	"""
+	asm = Assembler()
+	names = count(2)
+	
+	def block(level, loop_start, var):
+		if level == depth:
+			asm.line()
+			asm.emit("LOAD_FAST", 1, "b")
+			asm.emit("LOAD_CONST", 1, "1")
+			asm.emit("INPLACE_ADD")
+			asm.emit("STORE_FAST", 1, "b")
+		elif level % 2 == 0:  # for loop
+			var = next(names)
+			start, end = Label(), Label()
+			asm.line()
+			asm.emit("LOAD_FAST", 0, "a")
+			asm.emit("GET_ITER")
+			asm.mark(start)
+			asm.emit("FOR_ITER", end)
+			asm.emit("STORE_FAST", var, f"i{var}")
+			block(level + 1, start, var)
+			asm.emit("JUMP_ABSOLUTE", start)
+			asm.mark(end)
+		else:  # if statement, which is always the last statement in a loop, so it jumps to the loop's top
+			asm.line()
+			asm.emit("LOAD_FAST", var, f"i{var}")
+			asm.emit("POP_JUMP_IF_FALSE", loop_start)
+			block(level + 1, loop_start, var)
+	
+	for _ in range(width):
+		block(0, None, None)
+	asm.line()
+	asm.emit("LOAD_FAST", 1, "b")
+	asm.emit("RETURN_VALUE")
+	return asm.format()
+
+def module(funcs):
+	""" joins (name, listing) pairs the way dis.dis prints a module and the code objects in it.
+	The first function is the module's own code and gets no header"""
+	parts = []
+	for i, (name, listing) in enumerate(funcs):
+		if i:
+			parts.append(f"\nDisassembly of {name}:\n")
+		parts.append(listing)
+	return "".join(parts)
+
+def straight_line(num_statements):
+	""" a function made of num_statements simple assignments and calls:
+
+	def straight(a, b, c):
+		x = a + b * c
+		print(x, a)
+		...
+	"""
+	asm = Assembler()
+	for _ in range(num_statements // 2):
+		asm.line()
+		asm.emit("LOAD_FAST", 0, "a")
+		asm.emit("LOAD_FAST", 1, "b")
+		asm.emit("LOAD_FAST", 2, "c")
+		asm.emit("BINARY_MULTIPLY")
+		asm.emit("BINARY_ADD")
+		asm.emit("STORE_FAST", 3, "x")
+		asm.line()
+		asm.emit("LOAD_GLOBAL", 0, "print")
+		asm.emit("LOAD_FAST", 3, "x")
+		asm.emit("LOAD_FAST", 0, "a")
+		asm.emit("CALL_FUNCTION", 2)
+		asm.emit("POP_TOP")
+	asm.line()
+	asm.emit("LOAD_CONST", 0, "None")
+	asm.emit("RETURN_VALUE")
+	return asm.format()
+
+def long_expression(num_terms):
+	""" a function returning a single num_terms long chain: return a + b + b + ... + b"""
+	asm = Assembler()
+	asm.line()
+	asm.emit("LOAD_FAST", 0, "a")
+	for _ in range(num_terms - 1):
+		asm.emit("LOAD_FAST", 1, "b")
+		asm.emit("BINARY_ADD")
+	asm.emit("RETURN_VALUE")
+	return asm.format()
+
+def _listcomp(address, line_num):
+	""" [c + 1 for c in .0] """
+	asm = Assembler()
+	start, end = Label(), Label()
+	asm.line(line_num)
+	asm.emit("BUILD_LIST", 0)
+	asm.emit("LOAD_FAST", 0, ".0")
+	asm.mark(start)
+	asm.emit("FOR_ITER", end)
+	asm.emit("STORE_FAST", 1, "c")
+	asm.emit("LOAD_FAST", 1, "c")
+	asm.emit("LOAD_CONST", 0, "1")
+	asm.emit("BINARY_ADD")
+	asm.emit("LIST_APPEND", 2)
+	asm.emit("JUMP_ABSOLUTE", start)
+	asm.mark(end)
+	asm.emit("RETURN_VALUE")
+	return f'<code object <listcomp> at {address:#x}, file "synthetic.py", line {line_num}>', asm.format()
+
+def comprehensions(num_comprehensions):
+	""" a module of num_comprehensions statements like o = [c + 1 for c in s], each with its own
+	listcomp code object"""
+	asm = Assembler()
+	comps = []
+	for i in range(num_comprehensions):
+		name, listing = _listcomp(0x7f0000000000 + 0xb0 * i, i + 1)
+		comps.append((name, listing))
+		asm.line()
+		asm.emit("LOAD_CONST", 2 * i, name)
+		asm.emit("LOAD_CONST", 2 * i + 1, "'<listcomp>'")
+		asm.emit("MAKE_FUNCTION", 0)
+		asm.emit("LOAD_NAME", 0, "s")
+		asm.emit("GET_ITER")
+		asm.emit("CALL_FUNCTION", 1)
+		asm.emit("STORE_NAME", 1, "o")
+	asm.line()
+	asm.emit("LOAD_CONST", 2 * num_comprehensions, "None")
+	asm.emit("RETURN_VALUE")
+	return module([("main", asm.format())] + comps)
+
+def big_literals(num_elements):
+	""" a function building a num_elements long list literal and a dict literal of the same size"""
+	asm = Assembler()
+	asm.line()
+	for i in range(num_elements):
+		asm.emit("LOAD_CONST", i, str(i))
+	asm.emit("BUILD_LIST", num_elements)
+	asm.emit("STORE_FAST", 0, "l")
+	asm.line()
+	for i in range(num_elements):
+		asm.emit("LOAD_CONST", i, repr(f"key{i}"))
+		asm.emit("LOAD_FAST", 0, "l")
+	asm.emit("BUILD_MAP", num_elements)
+	asm.emit("STORE_FAST", 1, "d")
+	asm.line()
+	asm.emit("LOAD_CONST", 0, "None")
+	asm.emit("RETURN_VALUE")
+	return asm.format()
+
+def many_functions(num_functions, statements_per_function=10):
+	""" a module listing with num_functions small functions, each under its own header"""
+	return module(
+		[(f"f{i}", straight_line(statements_per_function)) for i in range(num_functions)]
+	)
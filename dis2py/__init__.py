@@ -1 +1,72 @@
-from .dis2py import *
\ No newline at end of file
+""" converts the output of dis.dis back into python source code"""
+# the public API. Each name is imported from its submodule the first time it's used (PEP 562),
+# so that `import dis2py` stays cheap
+_exports = {
+	"COMPREHENSION": "dis2py",
+	"GEN_EXPR": "dis2py",
+	"RAW_JUMPS": "dis2py",
+	"DEDUPE": "dis2py",
+	"SHARED_HELPERS": "dis2py",
+	"decompile": "dis2py",
+	"decompile_all": "dis2py",
+	"decompile_stream": "dis2py",
+	"decompile_code": "dis2py",
+	"UnsupportedBytecodeError": "dis2py",
+	"pretty_decompile": "dis2py",
+	"pretty_decompile_to": "dis2py",
+	"write_functions": "dis2py",
+	"format_function": "dis2py",
+	"split_funcs": "dis2py",
+	"dis_to_instructions": "dis2py",
+	"instructions_to_asts": "dis2py",
+	"asts_to_code": "dis2py",
+	"register_handler": "dis2py",
+	"decompile_file": "index",
+	"decompile_function": "index",
+	"FunctionIndex": "index",
+	"FunctionNotFound": "index",
+	"DecompileCache": "cache",
+	"DecompileSession": "session",
+	"DecompileStats": "stats",
+	# everything else `from .dis2py import *` used to give
+	"BATCH_SIZE": "dis2py",
+	"TABLE_THRESHOLD": "dis2py",
+	"LARGE_CONST_SIZE": "dis2py",
+	"BYTECODE_VERSION": "dis2py",
+	"Instruction": "dis2py",
+	"InstructionTable": "dis2py",
+	"get_code_obj_name": "dis2py",
+	"dis_to_instruction_table": "dis2py",
+	"code_to_instructions": "dis2py",
+	"code_arg_names": "dis2py",
+	"is_store": "dis2py",
+	"is_identifier": "dis2py",
+	"AstBuilder": "dis2py",
+	"HANDLERS": "dis2py",
+	"write_code": "dis2py",
+	"decompile_instructions": "dis2py",
+	"split_funcs_stream": "dis2py",
+	"split_code": "dis2py",
+	"get_flags": "dis2py",
+	"strip_comments": "dis2py",
+	"operations": "operations",
+}
+__all__ = list(_exports)
+
+def __getattr__(name):
+	from importlib import import_module
+	if name.startswith("__"):
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+	# everything else dis2py.dis2py defines used to be re-exported here, so it still is
+	module = import_module(f".{_exports.get(name, 'dis2py')}", __name__)
+	if name in globals():  # a submodule, which importing sets as an attribute of the package
+		return globals()[name]
+	try:
+		value = getattr(module, name)
+	except AttributeError:
+		raise AttributeError(f"module {__name__!r} has no attribute {name!r}") from None
+	globals()[name] = value  # later lookups don't go through __getattr__
+	return value
+
+def __dir__():
+	return sorted(set(globals()) | set(__all__))
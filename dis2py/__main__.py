@@ -1,17 +1,185 @@
-from .dis2py import pretty_decompile, RAW_JUMPS
+from .dis2py import _decompile_inputs, _stream_funcs, write_functions, format_function, DEDUPE, RAW_JUMPS, SHARED_HELPERS
+from contextlib import nullcontext
+from functools import partial
+from glob import glob, has_magic
+from pathlib import Path
 import argparse
+import sys
+import time
+# the cache, profiling, process pool and json output are imported only when they're asked for,
+# to keep startup fast
+
+def is_listing(path):
+	""" whether a file found in a directory or by a glob is a listing, rather than the index --save-index wrote for one"""
+	from .index import INDEX_SUFFIX
+	return not str(path).endswith((INDEX_SUFFIX, INDEX_SUFFIX + ".tmp"))
+
+def expand_inputs(patterns):
+	""" expands the files, directories and globs given on the command line into (path, output name) pairs.
+	Files inside a directory keep their path relative to it as their output name, and files matched by a glob
+	their path relative to the part of the glob before the first wildcard"""
+	inputs = []
+	for pattern in patterns:
+		if pattern == "-":
+			inputs.append(("-", Path("stdin")))
+		elif Path(pattern).is_dir():
+			root = Path(pattern)
+			inputs.extend(
+				(str(path), path.relative_to(root)) for path in sorted(root.rglob("*")) if path.is_file() and is_listing(path)
+			)
+		elif has_magic(pattern):
+			parts = Path(pattern).parts
+			root = Path(*parts[:next(i for i, part in enumerate(parts) if has_magic(part))])
+			inputs.extend(
+				(path, Path(path).relative_to(root)) for path in sorted(glob(pattern, recursive=True)) if is_listing(path)
+			)
+		else:
+			inputs.append((pattern, Path(Path(pattern).name)))
+	return inputs
+
+def open_input(path, functions=None, save_index=False):
+	""" the (name, disassembly) pairs of one input and their total size (None for stdin, which is streamed),
+	like index.open_listing"""
+	if path == "-":
+		return nullcontext((_stream_funcs(sys.stdin), None))
+	from .index import open_listing
+	return open_listing(path, functions, save_index)
+
+def serve_main(argv):
+	from .server import MAX_REQUEST_SIZE, serve
+	import asyncio
+	parser = argparse.ArgumentParser(
+		prog="python -m dis2py serve", description="Serves decompilation requests (JSON lines) until interrupted."
+	)
+	address = parser.add_mutually_exclusive_group(required=True)
+	address.add_argument("--socket", help="path of the unix socket to listen on")
+	address.add_argument("--port", type=int, help="localhost tcp port to listen on")
+	parser.add_argument("--host", default="127.0.0.1")
+	parser.add_argument("-j", "--jobs", type=int, help="worker processes (default: one per cpu)")
+	parser.add_argument(
+		"--max-request-size", type=int, default=MAX_REQUEST_SIZE // (1024 * 1024), help="in MiB"
+	)
+	args = parser.parse_args(argv)
+	try:
+		asyncio.run(serve(args.socket, args.host, args.port, args.jobs, args.max_request_size * 1024 * 1024))
+	except (KeyboardInterrupt, asyncio.CancelledError):
+		pass
 
 def main():
+	if sys.argv[1:2] == ["serve"]:
+		serve_main(sys.argv[2:])
+		return
 	parser = argparse.ArgumentParser(description="Converts dis.dis output into Python source code.")
-	parser.add_argument("file", type=argparse.FileType("r"))
-	parser.add_argument("-f", "--flags", type=int)
+	parser.add_argument("files", nargs="+", metavar="file")
+	parser.add_argument("-f", "--flags", type=int, default=0)
 	parser.add_argument("-r", "--raw-jumps", action="store_true")
+	parser.add_argument("--dedupe", action="store_true", help="decompile identical function bodies only once")
+	parser.add_argument(
+		"--shared-helpers", action="store_true", help="also output identical functions only once, under one name"
+	)
+	parser.add_argument("-j", "--jobs", type=int, default=1)
+	output = parser.add_mutually_exclusive_group()
+	output.add_argument("-o", "--output-dir", type=Path)
+	output.add_argument("--jsonl", action="store_true")
+	parser.add_argument("--cache-dir", type=Path)
+	parser.add_argument("--cache-size", type=int, default=256, help="in MiB")
+	parser.add_argument(
+		"--function", action="append", dest="functions", metavar="NAME",
+		help="only decompile this function and the ones nested in it (can be repeated)"
+	)
+	parser.add_argument(
+		"--save-index", action="store_true", help="save the offsets of each function next to the input, to find them faster next time"
+	)
+	parser.add_argument("--profile", action="store_true", help="print time spent per stage, function and opcode to stderr")
 	args = parser.parse_args()
 	flags = args.flags
 	if args.raw_jumps:
 		flags |= RAW_JUMPS
-	with args.file as f:
-		print(pretty_decompile(f.read()))
+	if args.dedupe:
+		flags |= DEDUPE
+	if args.shared_helpers:
+		flags |= SHARED_HELPERS
+	cache = None
+	if args.cache_dir is not None:
+		from .cache import DecompileCache
+		cache = DecompileCache(args.cache_dir, args.cache_size * 1024 * 1024)
+	stats = None
+	if args.profile:
+		from .stats import DecompileStats
+		stats = DecompileStats()
+	inputs = expand_inputs(args.files)
+	if args.output_dir is not None:
+		written_by = {}  # output path -> the input written there
+		for path, output_name in inputs:
+			other = written_by.setdefault(output_name.with_suffix(".py"), path)
+			if other != path:
+				parser.error(f"'{other}' and '{path}' would both be written to {args.output_dir / output_name.with_suffix('.py')}")
+	if args.functions and any(path == "-" for path, _ in inputs):
+		parser.error("--function needs files to read, not stdin")
+	
+	if len(inputs) == 1 and inputs[0][0] == args.files[0] and args.output_dir is None and not args.jsonl:
+		# single input: stream straight to stdout, each line as soon as it's rendered
+		path = inputs[0][0]
+		from .index import FunctionNotFound
+		try:
+			with open_input(path, args.functions, args.save_index) as (funcs, total_size):
+				write_functions(sys.stdout, funcs, flags, workers=args.jobs, cache=cache, stats=stats, total_size=total_size)
+		except OSError as e:
+			if e.filename != path:  # not from opening it, eg. stdout being closed
+				raise
+			parser.error(f"can't open '{path}': {e}")
+		except FunctionNotFound as e:
+			parser.error(f"no function {e}")
+		if stats is not None:
+			print(stats.report(), file=sys.stderr)
+		return
+	
+	if args.jsonl:
+		import json
+	failures = 0
+	start = time.perf_counter()
+	listings = (
+		((path, output_name), partial(open_input, path, args.functions, args.save_index)) for path, output_name in inputs
+	)
+	file_start = start
+	# with several jobs, the next files are already being decompiled while one is written out, so the time
+	# reported for each is how long it was waited for
+	for (path, output_name), funcs, error in _decompile_inputs(listings, flags, "\t", args.jobs, cache, stats):
+		elapsed = time.perf_counter() - file_start
+		if error is not None:
+			failures += 1
+			print(f"{path}: failed: {type(error).__name__}: {error}", file=sys.stderr)
+			if args.jsonl:
+				print(json.dumps({"file": path, "error": f"{type(error).__name__}: {error}"}))
+		else:
+			if args.jsonl:
+				print(
+					json.dumps({
+					"file": path,
+					"seconds": elapsed,
+					"functions": [{"name": name, "args": arg_names, "code": code} for name, code, arg_names in funcs]
+					})
+				)
+			else:
+				source = "\n".join(format_function(name, code, arg_names) for name, code, arg_names in funcs)
+				if args.output_dir is None:
+					print(f"# {path}")
+					print(source)
+				else:
+					output_path = args.output_dir / output_name.with_suffix(".py")
+					output_path.parent.mkdir(parents=True, exist_ok=True)
+					output_path.write_text(source + "\n")
+			print(f"{path}: {len(funcs)} functions in {elapsed:.3f}s", file=sys.stderr)
+		file_start = time.perf_counter()
+	print(
+		f"{len(inputs)} files, {failures} failed in {time.perf_counter() - start:.3f}s", file=sys.stderr
+	)
+	if cache is not None:
+		print(f"cache: {cache.hits} hits, {cache.misses} misses, {cache.evictions} evictions", file=sys.stderr)
+	if stats is not None:
+		print(stats.report(), file=sys.stderr)
+	if failures:
+		sys.exit(1)
 
 if __name__ == "__main__":
 	main()
\ No newline at end of file
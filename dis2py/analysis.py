@@ -0,0 +1,118 @@
+# jumps whose arg is the absolute target offset. Relative jumps (FOR_ITER, JUMP_FORWARD, SETUP_*)
+# are recognized by their "to <offset>" argval instead
+ABSOLUTE_JUMPS = (
+	"POP_JUMP_IF_TRUE", "POP_JUMP_IF_FALSE", "JUMP_ABSOLUTE", "JUMP_IF_TRUE_OR_POP", "JUMP_IF_FALSE_OR_POP",
+	"JUMP_IF_NOT_EXC_MATCH", "CONTINUE_LOOP"
+)
+# instructions after which execution never falls through to the next instruction
+TERMINATORS = ("JUMP_ABSOLUTE", "JUMP_FORWARD", "RETURN_VALUE", "RAISE_VARARGS", "RERAISE")
+
+def _jump_target(opname, arg, argval):
+	if opname in ABSOLUTE_JUMPS:
+		return arg
+	if type(argval) is str and argval.startswith("to ") and argval[len("to "):].isdigit():
+		return int(argval[len("to "):])
+	return None
+
+def _is_branch(opname):
+	return opname.startswith("POP_JUMP") or opname == "FOR_ITER"
+
+def _rows(instructions):
+	""" yields (offset, opname, arg, argval) for each instruction, straight from the columns of
+	an InstructionTable rather than creating each Instruction"""
+	rows = getattr(instructions, "rows", None)
+	if rows is not None:
+		return rows()
+	return ((instruction.offset, instruction.opname, instruction.arg, instruction.argval) for instruction in instructions)
+
+class BasicBlock:
+	__slots__ = ("start", "end", "is_loop_header")
+	
+	def __init__(self, start, end, is_loop_header=False):
+		self.start = start  # index of the first instruction
+		self.end = end  # index one past the last instruction
+		self.is_loop_header = is_loop_header
+	
+	def __repr__(self):
+		return f"BasicBlock(start={self.start!r}, end={self.end!r}, is_loop_header={self.is_loop_header!r})"
+
+class FlowGraph:
+	""" control flow information for the instructions of one function, computed in a single pass
+	so that jumps can be classified without rescanning the instructions"""
+	def __init__(self, instructions):
+		self.instructions = instructions
+		# offset -> index of the first instruction at that offset
+		self.offset_index = {}
+		# target offset -> index of the first JUMP_ABSOLUTE to it
+		self.first_jump_absolute = {}
+		# offsets that a FOR_ITER exits to or a POP_JUMP jumps to
+		self.loop_exits = set()
+		# index -> index of the closest POP_JUMP/FOR_ITER before it, or None
+		self.prev_branch = []
+		self._blocks = None
+		self._jump_sources = None
+		
+		prev_branch = None
+		for i, (offset, opname, arg, argval) in enumerate(_rows(instructions)):
+			self.offset_index.setdefault(offset, i)
+			self.prev_branch.append(prev_branch)
+			is_branch = _is_branch(opname)
+			if is_branch or opname == "JUMP_ABSOLUTE":
+				target = _jump_target(opname, arg, argval)
+				if opname == "JUMP_ABSOLUTE":
+					self.first_jump_absolute.setdefault(target, i)
+				elif target is not None:
+					self.loop_exits.add(target)
+			if is_branch:
+				prev_branch = i
+	
+	@property
+	def blocks(self):
+		""" the basic blocks of the function, in order. The decompiler doesn't use them itself,
+		so they're only worked out the first time they're asked for"""
+		if self._blocks is None:
+			self._build_blocks()
+		return self._blocks
+	
+	@property
+	def jump_sources(self):
+		""" target offset -> indices of the instructions jumping to it, in order. Worked out along with blocks"""
+		if self._jump_sources is None:
+			self._build_blocks()
+		return self._jump_sources
+	
+	def _build_blocks(self):
+		leaders = {0}  # indices that start a basic block
+		loop_headers = set()  # offsets jumped to from the same offset or below them
+		jump_sources = {}
+		offsets = []
+		for i, (offset, opname, arg, argval) in enumerate(_rows(self.instructions)):
+			offsets.append(offset)
+			target = _jump_target(opname, arg, argval)
+			if target is not None:
+				jump_sources.setdefault(target, []).append(i)
+				index = self.offset_index.get(target)
+				if index is not None:
+					leaders.add(index)
+				if target <= offset:
+					loop_headers.add(target)
+				leaders.add(i + 1)
+			elif opname in TERMINATORS:
+				leaders.add(i + 1)
+		starts = sorted(leader for leader in leaders if leader < len(offsets))
+		self._blocks = [
+			BasicBlock(start, end, offsets[start] in loop_headers) for start, end in zip(starts, starts[1:] + [len(offsets)])
+		]
+		self._jump_sources = jump_sources
+	
+	def index_at(self, offset):
+		return self.offset_index.get(offset)
+	
+	def is_loop_exit(self, offset):
+		""" whether a FOR_ITER or POP_JUMP jumps to this offset"""
+		return offset in self.loop_exits
+	
+	def first_branch_is(self, i, offset):
+		""" whether the POP_JUMP/FOR_ITER at index i is the first one at or after offset"""
+		prev_branch = self.prev_branch[i]
+		return prev_branch is None or self.instructions[prev_branch].offset < offset
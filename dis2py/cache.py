@@ -0,0 +1,107 @@
+import hashlib
+import json
+import os
+import re
+import tempfile
+from pathlib import Path
+
+# bump whenever a change to the decompiler changes its output, so old entries are ignored
+CACHE_VERSION = 1
+# eviction goes on until the cache is down to this fraction of its max_size, so that it isn't
+# needed again (scanning every entry) on the very next put
+LOW_WATER_MARK = 0.9
+
+_trailing_whitespace_re = re.compile(r"[^\S\n]+$", re.MULTILINE)
+_blank_lines_re = re.compile(r"\n{2,}")
+
+def normalize(disasm):
+	""" drops the parts of a function's disassembly that can't change how it decompiles:
+	trailing whitespace and blank lines"""
+	disasm = _trailing_whitespace_re.sub("", disasm)
+	return _blank_lines_re.sub("\n", disasm).strip("\n")
+
+def content_key(disasm, flags, tab_char):
+	""" hash of everything that decides how a function decompiles"""
+	digest = hashlib.blake2b(digest_size=20)
+	digest.update(f"{CACHE_VERSION}\0{flags}\0{tab_char}\0".encode())
+	digest.update(normalize(disasm).encode())
+	return digest.hexdigest()
+
+class DecompileCache:
+	""" content-addressed on-disk cache of decompiled functions, keyed on the normalized disassembly,
+	the flags and tab_char. Once the entries take up more than max_size bytes, the least recently
+	used ones are evicted"""
+	def __init__(self, directory, max_size=256 * 1024 * 1024):
+		self.directory = Path(directory)
+		self.max_size = max_size
+		self.hits = 0
+		self.misses = 0
+		self.evictions = 0
+		self.directory.mkdir(parents=True, exist_ok=True)
+		self.size = sum(entry.stat().st_size for entry in self._entries())
+	
+	def _entries(self):
+		return self.directory.glob("*/*.json")
+	
+	def key(self, disasm, flags, tab_char):
+		return content_key(disasm, flags, tab_char)
+	
+	def _path(self, key):
+		return self.directory / key[:2] / f"{key}.json"
+	
+	def get(self, disasm, flags, tab_char):
+		""" returns the cached (code, arg_names), or None"""
+		path = self._path(self.key(disasm, flags, tab_char))
+		try:
+			with open(path) as f:
+				entry = json.load(f)
+			os.utime(path)  # mark as recently used
+		except (OSError, ValueError):
+			self.misses += 1
+			return None
+		self.hits += 1
+		return entry["code"], entry["arg_names"]
+	
+	def put(self, disasm, flags, tab_char, result):
+		code, arg_names = result
+		path = self._path(self.key(disasm, flags, tab_char))
+		path.parent.mkdir(exist_ok=True)
+		data = json.dumps({"code": code, "arg_names": arg_names}).encode()
+		# write to a temporary file first so readers never see a partial entry
+		fd, temp_path = tempfile.mkstemp(dir=path.parent)
+		with os.fdopen(fd, "wb") as f:
+			f.write(data)
+		try:
+			self.size -= path.stat().st_size  # an entry being replaced
+		except OSError:
+			pass
+		os.replace(temp_path, path)
+		self.size += len(data)
+		if self.size > self.max_size:
+			self.evict()
+	
+	def evict(self):
+		""" removes the least recently used entries until the cache is down to LOW_WATER_MARK of max_size"""
+		entries = []
+		for path in self._entries():
+			try:
+				entries.append((path.stat(), path))
+			except OSError:  # removed by someone else in the meantime
+				pass
+		entries.sort(key=lambda entry: entry[0].st_mtime)
+		self.size = sum(stat.st_size for stat, _ in entries)
+		target = self.max_size * LOW_WATER_MARK
+		for stat, path in entries:
+			if self.size <= target:
+				break
+			try:
+				path.unlink()
+			except OSError:
+				continue
+			self.size -= stat.st_size
+			self.evictions += 1
+	
+	def clear(self):
+		for path in self._entries():
+			path.unlink()
+		self.size = 0
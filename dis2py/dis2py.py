@@ -1,444 +1,818 @@
+from array import array
+import os
 import re
-from ast import literal_eval
-from dataclasses import dataclass
+import sys
+from collections import defaultdict, deque
+from functools import lru_cache
+from itertools import chain, starmap
+from opcode import opname as _all_opnames
+from time import perf_counter
+from types import CodeType
 
 from . import operations
+from .analysis import FlowGraph
+# dis, ast, concurrent.futures and .stats are imported where they're used, as importing them
+# up front makes up most of the startup time
 
 COMPREHENSION = 1
 GEN_EXPR = 1 << 2
 RAW_JUMPS = 1 << 3
-@dataclass
+# decompile each distinct function body only once, reusing the result for identical ones
+DEDUPE = 1 << 4
+# like DEDUPE, but only output one function for each distinct body, and refer to it wherever
+# any of the identical ones is used. This needs to read the whole listing first
+SHARED_HELPERS = 1 << 5
+# amount of disassembly text (in characters) sent to a worker process at once, so that
+# many tiny comprehensions share a single round trip
+BATCH_SIZE = 1 << 16
+# functions with more disassembly than this (in characters) are parsed into an InstructionTable
+# instead of a list of Instruction, which would take up several times more memory
+TABLE_THRESHOLD = 1 << 20
+# LOAD_CONST argvals longer than this are left in the disassembly as a ConstRef until they're rendered
+LARGE_CONST_SIZE = 1 << 12
+# the only bytecode the handlers understand, which matters when decompiling code objects of the running interpreter
+BYTECODE_VERSION = (3, 8)
+# code object flags, as in the inspect module
+_CO_VARARGS = 0x04
+_CO_VARKEYWORDS = 0x08
+
+class UnsupportedBytecodeError(RuntimeError):
+	""" raised by decompile_code when the running interpreter's bytecode isn't BYTECODE_VERSION's"""
+
 class Instruction:
-	line_num: int
-	offset: int
-	opname: str
-	arg: int
-	argval: object
+	# written out rather than a dataclass, as importing dataclasses slows down startup noticeably
+	__slots__ = ("line_num", "offset", "opname", "arg", "argval")
+	
+	def __init__(self, line_num, offset, opname, arg, argval):
+		self.line_num = line_num
+		self.offset = offset
+		self.opname = opname
+		self.arg = arg
+		self.argval = argval
+	
+	def _fields(self):
+		return (self.line_num, self.offset, self.opname, self.arg, self.argval)
+	
+	def __repr__(self):
+		return (
+			f"Instruction(line_num={self.line_num!r}, offset={self.offset!r}, opname={self.opname!r}, "
+			f"arg={self.arg!r}, argval={self.argval!r})"
+		)
+	
+	def __eq__(self, other):
+		if other.__class__ is not self.__class__:
+			return NotImplemented
+		return self._fields() == other._fields()
+	
+	__hash__ = None
+
+class InstructionTable:
+	""" columnar storage for the instructions of a function. Indexing, slicing and iterating it work
+	like on a list of Instruction (which are created on demand), but it takes a fraction of the memory"""
+	__slots__ = ("line_nums", "offsets", "opcodes", "args", "argvals", "opnames", "opname_codes")
+	
+	def __init__(self, instructions=()):
+		self.line_nums = array("i")  # -1 for None
+		self.offsets = array("i")
+		self.opcodes = array("H")  # index into opnames
+		self.args = array("q")  # -1 for None
+		self.argvals = []
+		self.opnames = []  # the distinct opnames, in order of first appearance
+		self.opname_codes = {}  # opname -> index in opnames
+		for instruction in instructions:
+			self.append(instruction.line_num, instruction.offset, instruction.opname, instruction.arg, instruction.argval)
+	
+	def opname_code(self, opname):
+		code = self.opname_codes.get(opname)
+		if code is None:
+			code = self.opname_codes[opname] = len(self.opnames)
+			self.opnames.append(opname)
+			if code > 0xffff and self.opcodes.typecode == "H":  # only in a badly damaged listing
+				self.opcodes = array("I", self.opcodes)
+		return code
+	
+	def append(self, line_num, offset, opname, arg, argval):
+		self.line_nums.append(-1 if line_num is None else line_num)
+		self.offsets.append(offset)
+		code = self.opname_codes.get(opname)
+		if code is None:
+			code = self.opname_code(opname)  # before looking up opcodes, which this can replace
+		self.opcodes.append(code)
+		self.args.append(-1 if arg is None else arg)
+		self.argvals.append(argval)
+	
+	def __len__(self):
+		return len(self.offsets)
+	
+	def __getitem__(self, index):
+		if isinstance(index, slice):
+			return [self[i] for i in range(*index.indices(len(self)))]
+		line_num = self.line_nums[index]
+		arg = self.args[index]
+		return Instruction(
+			None if line_num == -1 else line_num, self.offsets[index], self.opnames[self.opcodes[index]],
+			None if arg == -1 else arg, self.argvals[index]
+		)
+	
+	def __iter__(self):
+		for line_num, (offset, opname, arg, argval) in zip(self.line_nums, self.rows()):
+			yield Instruction(None if line_num == -1 else line_num, offset, opname, arg, argval)
+	
+	def rows(self):
+		""" yields (offset, opname, arg, argval) for each instruction, without creating Instructions"""
+		opnames = self.opnames
+		for offset, opcode, arg, argval in zip(self.offsets, self.opcodes, self.args, self.argvals):
+			yield offset, opnames[opcode], None if arg == -1 else arg, argval
 
 def get_code_obj_name(s):
 	
 	match = re.match(r"<code object <?(.*?)>? at (0x[0-9a-f]+).*>", s)
 	return match.group(1) + "_" + match.group(2)
 
+@lru_cache(maxsize=None)
+def _compile(pattern, flags=0):
+	""" compiles the regexes below on first use rather than at import"""
+	return re.compile(pattern, flags)
+
+# matches a well-formed instruction line of dis.dis output, anchored to the whole line
+_instruction_pattern = (
+	r"^ *(?:(?P<line_num>\d+) +)?(?:>> +)?(?P<offset>\d+) (?P<opname>[A-Z_]+)(?: +(?P<arg>\d+)(?: \((?P<argval>.+)\))?)?\r?$\n?"
+)
+# fallback for the lines in between that the strict pattern can't classify. It never crosses a
+# newline and swallows the rest of the line, so a finditer over a run of lines finds exactly
+# what a re.search on each line would
+_loose_instruction_pattern = (
+	r"( ?(?P<line_num>\d+)[ >]+)?(?P<offset>\d+) (?P<opname>[A-Z_]+)(?:[^\S\n]+(?P<arg>\d+)(?: \((?P<argval>.+)\))?)?.*"
+)
+
+def _match_instructions(disasm):
+	""" yields a match for each instruction line in disasm, in a single pass over the string"""
+	instruction_re = _compile(_instruction_pattern, re.MULTILINE)
+	loose_instruction_re = _compile(_loose_instruction_pattern)
+	pos = 0
+	for match in instruction_re.finditer(disasm):
+		start = match.start()
+		if start - pos > 2:  # nothing shorter than "0 A" can hold an instruction
+			yield from loose_instruction_re.finditer(disasm, pos, start)
+		yield match
+		pos = match.end()
+	yield from loose_instruction_re.finditer(disasm, pos)
+
+def _lex_instructions(disasm):
+	""" yields the (line_num, offset, opname, arg, argval) of each instruction in disasm. The argval is None,
+	a str, or a ConstRef if it's a large constant"""
+	line_num = None
+	# one copy of each distinct opname and argval (names, constants) is shared by every instruction using it,
+	# rather than each keeping the strings its match made
+	intern = {}.setdefault
+	for match in _match_instructions(disasm):
+		line_num_str, offset, opname, arg = match.group("line_num", "offset", "opname", "arg")
+		if line_num_str:
+			line_num = int(line_num_str)
+		if opname == "EXTENDED_ARG":
+			continue
+		start, end = match.span("argval")
+		if start == -1:
+			argval = None
+		elif end - start > LARGE_CONST_SIZE and opname == "LOAD_CONST":
+			argval = operations.ConstRef(disasm, start, end)
+		else:
+			argval = disasm[start:end]
+			argval = intern(argval, argval)
+		yield line_num, int(offset), intern(opname, opname), None if arg is None else int(arg), argval
+
 def dis_to_instructions(disasm):
 	""" converts output of dis.dis into list of instructions"""
+	return list(starmap(Instruction, _lex_instructions(disasm)))
+
+def dis_to_instruction_table(disasm):
+	""" like dis_to_instructions, but returns an InstructionTable"""
+	table = InstructionTable()
+	append = table.append
+	for fields in _lex_instructions(disasm):
+		append(*fields)
+	return table
+
+def code_to_instructions(code):
+	""" converts a code object into the same list of instructions dis_to_instructions would give
+	for its disassembly"""
+	import dis
+	line_starts = dict(dis.findlinestarts(code))
 	line_num = None
 	instructions = []
-	for line in disasm.split("\n"):
-		match = re.search(
-			r"( ?(?P<line_num>\d+)[ >]+)?(?P<offset>\d+) (?P<opname>[A-Z_]+)(?:\s+(?P<arg>\d+)(?: \((?P<argval>.+)\))?)?",
-			line
-		)
-		if match is not None:
-			if match["line_num"]:
-				line_num = int(match["line_num"])
-			offset = int(match["offset"])
-			opname = match["opname"]
-			if match["arg"] is not None:
-				arg = int(match["arg"])
-			else:
-				arg = None
-			if opname == "EXTENDED_ARG":
-				continue
-			argval = match["argval"]
-			instructions.append(Instruction(line_num, offset, opname, arg, argval))
+	intern = {}.setdefault  # see dis_to_instructions
+	for instruction in dis.get_instructions(code):
+		line_num = line_starts.get(instruction.offset) or line_num
+		if instruction.opname == "EXTENDED_ARG":
+			continue
+		# the text format only shows argrepr, in parentheses when it's not empty
+		argval = instruction.argrepr or None
+		if argval is not None:
+			argval = intern(argval, argval)
+		instructions.append(Instruction(line_num, instruction.offset, instruction.opname, instruction.arg, argval))
 	return instructions
 
+def code_arg_names(code, flags=0):
+	""" returns the arguments of a code object as they'd be written in its def, eg. ["a", "*args", "b"].
+	The free variables of a closure come first, as that's how operations.Closure passes them in"""
+	varnames = code.co_varnames
+	num_pos = code.co_argcount
+	num_kwonly = code.co_kwonlyargcount
+	num_posonly = getattr(code, "co_posonlyargcount", 0)
+	arg_names = list(code.co_freevars) + list(varnames[:num_pos])
+	if num_posonly:
+		arg_names.insert(len(code.co_freevars) + num_posonly, "/")
+	i = num_pos + num_kwonly
+	if code.co_flags & _CO_VARARGS:
+		arg_names.append("*" + varnames[i])
+		i += 1
+	elif num_kwonly:
+		arg_names.append("*")
+	arg_names.extend(varnames[num_pos:num_pos + num_kwonly])
+	if code.co_flags & _CO_VARKEYWORDS:
+		arg_names.append("**" + varnames[i])
+	if flags & (COMPREHENSION | GEN_EXPR):  # named like instructions_to_asts renames the loads of .0
+		arg_names = ["__" + name[1:] if name.startswith(".") else name for name in arg_names]
+	return arg_names
+
 def is_store(instruction):
 	return instruction.opname in ("STORE_FAST", "STORE_NAME", "STORE_GLOBAL", "STORE_DEREF")
 
 def is_identifier(s: str):
 	return str.isidentifier(s) and s not in ("True", "False", "None")
 
-def instructions_to_asts(instructions, flags=0):
-	""" converts list of instruction into an AST"""
-	is_comp = flags & COMPREHENSION
-	is_genexpr = flags & GEN_EXPR
-	raw_jumps = flags & RAW_JUMPS
+class AstBuilder:
+	""" the state instructions_to_asts shares with the opcode handlers while it walks a function"""
 	temp_name = "__temp"  # name of temporary list/set/etc for comprehensions
-	indent = 0
-	arg_names = []
-	var_names = []
-	# list of all future changes in indentation (caused by loops,if,etc). format is (offset,change)
-	indent_changes = []
-	ast = []
-	instruction = None
-	def push(operation):
-		if raw_jumps:
-			ast.append((indent,operation,instruction.offset))
+	
+	def __init__(self, instructions, flags=0, stats=None, arg_names=None):
+		self.instructions = instructions
+		self.is_comp = flags & COMPREHENSION
+		self.is_genexpr = flags & GEN_EXPR
+		self.raw_jumps = flags & RAW_JUMPS
+		self.stats = stats
+		self.indent = 0
+		# when the real argument names aren't known, any name loaded before it's assigned is assumed to be one
+		self.infer_args = arg_names is None
+		self.arg_names = [] if arg_names is None else list(arg_names)
+		self.var_names = set()
+		self.values = {}  # name -> the Value shared by every use of it, see value()
+		self.constants = {}  # argval -> the python value it's the repr of, see constant()
+		# all future changes in indentation (caused by loops,if,etc). format is {offset: change}
+		self.indent_changes = defaultdict(int)
+		self.ast = []
+		self.flow = FlowGraph(instructions)
+		# index of the instruction being handled. Handlers that consume the instructions after it advance this
+		self.i = 0
+		self.instruction = None
+	
+	def push(self, operation):
+		if self.raw_jumps:
+			self.ast.append((self.indent, operation, self.instruction.offset))
 		else:
-			ast.append((indent, operation))
+			self.ast.append((self.indent, operation))
+	
+	def pop(self):
+		return self.ast.pop()[1]
 	
-	def pop():
-		return ast.pop()[1]
+	def value(self, val):
+		""" the Value for val. Operations are never changed once they're built, so one Value per name
+		is shared by the whole function instead of making one for every load"""
+		value = self.values.get(val)
+		if value is None:
+			value = self.values[val] = operations.Value(val)
+		return value
 	
-	def pop_n(n):
-		nonlocal ast
-		if n > 0:  # ast[:-0] would be the empty list and ast[-0:] would be every element in ast
-			if raw_jumps:
-				ret = [x for _, x,_ in ast[-n:]]
-			else:	
-				ret = [x for _, x in ast[-n:]]
-			ast = ast[:-n]
+	def constant(self, val):
+		""" the python value of the constant val (eg. a tuple of kwarg names), parsed once per function"""
+		try:
+			return self.constants[val]
+		except KeyError:
+			from ast import literal_eval
+			parsed = self.constants[val] = literal_eval(str(val))
+			return parsed
+	
+	def pop_n(self, n):
+		ast = self.ast
+		if n > 0:  # ast[-0:] would be every element in ast
+			ret = [entry[1] for entry in ast[-n:]]
+			del ast[-n:]  # truncate in place rather than copying the rest of ast
 		else:
 			ret = []
 		return ret
 	
-	def peek(i=1):
-		return ast[-i][1]
+	def peek(self, i=1):
+		return self.ast[-i][1]
 	
-	def dedent_jump_to(offset):
-		for instruction2 in instructions:
-			if instruction2.opname == "JUMP_ABSOLUTE" and instruction2.arg == offset:
-				indent_changes.append((instruction2.offset + 2, -1))
-				break
+	def dedent_jump_to(self, offset):
+		jump_index = self.flow.first_jump_absolute.get(offset)
+		if jump_index is not None:
+			self.indent_changes[self.instructions[jump_index].offset + 2] -= 1
 	
-	def push_invalid(instruction):
-		push(operations.Invalid(instruction.opname, instruction.arg, instruction.argval))
-	
-	i = 0
-	while i < len(instructions):
-		instruction = instructions[i]
-		opname = instruction.opname
-		if indent_changes:
-			to_remove = []
-			for indent_change in indent_changes:
-				if indent_change[0] == instruction.offset:
-					indent += indent_change[1]
-					to_remove.append(indent_change)
-			for indent_change in to_remove:
-				indent_changes.remove(indent_change)
-		if opname in ("LOAD_METHOD", "LOAD_ATTR"):
-			push(operations.Attribute(pop(), instruction.argval))
-		elif opname.startswith("LOAD"):
-			var_name = instruction.argval
-			if var_name.startswith(".") and (is_comp or is_genexpr):
-				var_name = "__" + var_name[1:]
-			if is_identifier(var_name):
-				if opname != "LOAD_GLOBAL" and var_name not in var_names:
-					arg_names.append(var_name)
-				var_names.append(var_name)
-			push(operations.Value(var_name))
-		elif is_store(instruction):
-			var_name = instruction.argval
-			if is_identifier(var_name):
-				var_names.append(var_name)
-			push(operations.Assign(var_name, pop()))
-		elif opname == "YIELD_VALUE":
-			push(operations.Yield(pop()))
-		elif opname == "RETURN_VALUE":
-			if is_comp:
-				push(operations.Return(operations.Value(temp_name)))
-			else:
-				push(operations.Return(pop()))
-		elif opname == "BUILD_MAP":
-			count = int(instruction.arg)
-			args = pop_n(2 * count)
-			push(operations.BuildMap(args))
-		elif opname == "BUILD_SLICE":
-			if instruction.arg == 2:
-				stop = pop()
-				start = pop()
-				push(operations.Slice(start, stop))
-			else:
-				step = pop()
-				stop = pop()
-				start = pop()
-				push(operations.Slice(start, stop, step))
-		elif opname.startswith("BUILD"):
-			# used to create lists, sets and tuples
-			operation = opname[len("BUILD_"):]
-			count = int(instruction.arg)
-			args = pop_n(count)
-			push(operations.build_operation(operation)(args))
-		elif opname == "GET_ITER":
-			push(operations.Iter(pop()))
-		elif opname == "FOR_ITER":
-			iterator = pop()
-			if isinstance(iterator, operations.Iter):
-				iterator = iterator.val
-			assign_op = instructions[i + 1]  # get next instruction
+	def push_invalid(self, instruction):
+		if self.stats is not None:
+			self.stats.invalid += 1
+		self.push(operations.Invalid(instruction.opname, instruction.arg, instruction.argval))
+
+# opname -> handler(builder, instruction). Filled in below for every opname dis knows about;
+# opnames from other python versions are resolved the first time they're seen
+HANDLERS = {}
+
+def register_handler(*opnames):
+	""" decorator registering a handler(builder, instruction) for opnames, replacing any existing one.
+	The handler is given the AstBuilder for the current function, and should push the operation(s)
+	the instruction produces onto it. instruction.argval is None or a str, except that a LOAD_CONST argval
+	longer than LARGE_CONST_SIZE is an operations.ConstRef: str() gives its text"""
+	def decorator(handler):
+		for opname in opnames:
+			HANDLERS[opname] = handler
+		return handler
+	return decorator
+
+@register_handler("LOAD_METHOD", "LOAD_ATTR")
+def _load_attr(builder, instruction):
+	builder.push(operations.Attribute(builder.pop(), instruction.argval))
+
+def _load(builder, instruction):
+	var_name = instruction.argval
+	if type(var_name) is operations.ConstRef:  # a large literal, left where it is until it's rendered
+		builder.push(operations.Value(var_name))
+		return
+	if var_name.startswith(".") and (builder.is_comp or builder.is_genexpr):
+		var_name = "__" + var_name[1:]
+	if is_identifier(var_name):
+		if builder.infer_args and instruction.opname != "LOAD_GLOBAL" and var_name not in builder.var_names:
+			builder.arg_names.append(var_name)
+		builder.var_names.add(var_name)
+	builder.push(builder.value(var_name))
+
+@register_handler("STORE_FAST", "STORE_NAME", "STORE_GLOBAL", "STORE_DEREF")
+def _store(builder, instruction):
+	var_name = instruction.argval
+	if is_identifier(var_name):
+		builder.var_names.add(var_name)
+	builder.push(operations.Assign(var_name, builder.pop()))
+
+@register_handler("YIELD_VALUE")
+def _yield_value(builder, instruction):
+	builder.push(operations.Yield(builder.pop()))
+
+@register_handler("RETURN_VALUE")
+def _return_value(builder, instruction):
+	if builder.is_comp:
+		builder.push(operations.Return(builder.value(builder.temp_name)))
+	else:
+		builder.push(operations.Return(builder.pop()))
+
+@register_handler("BUILD_MAP")
+def _build_map(builder, instruction):
+	count = int(instruction.arg)
+	args = builder.pop_n(2 * count)
+	builder.push(operations.BuildMap(args))
+
+@register_handler("BUILD_SLICE")
+def _build_slice(builder, instruction):
+	pop = builder.pop
+	if instruction.arg == 2:
+		stop = pop()
+		start = pop()
+		builder.push(operations.Slice(start, stop))
+	else:
+		step = pop()
+		stop = pop()
+		start = pop()
+		builder.push(operations.Slice(start, stop, step))
+
+def _build(builder, instruction):
+	# used to create lists, sets and tuples
+	operation = instruction.opname[len("BUILD_"):]
+	count = int(instruction.arg)
+	args = builder.pop_n(count)
+	builder.push(operations.build_operation(operation)(args))
+
+@register_handler("GET_ITER")
+def _get_iter(builder, instruction):
+	builder.push(operations.Iter(builder.pop()))
+
+@register_handler("FOR_ITER")
+def _for_iter(builder, instruction):
+	iterator = builder.pop()
+	if isinstance(iterator, operations.Iter):
+		iterator = iterator.val
+	builder.i += 1
+	i = builder.i
+	assign_op = builder.instructions[i]  # get next instruction
+	if is_store(assign_op):
+		index = assign_op.argval
+		builder.var_names.add(index)
+		builder.push(operations.ForLoop([index], iterator))
+		builder.indent += 1
+		#detect end of loop
+		loop_end = int(instruction.argval[len("to "):])
+		builder.indent_changes[loop_end] -= 1
+	elif assign_op.opname == "UNPACK_SEQUENCE":
+		# loops like for i,j in zip(x,y)
+		num_vals = assign_op.arg
+		assign_ops = builder.instructions[i + 1:i + num_vals + 1]
+		builder.i += num_vals  #skip all stores
+		indicies = []
+		for op in assign_ops:
+			var_name = op.argval
+			builder.var_names.add(var_name)
+			indicies.append(var_name)
+		builder.push(operations.ForLoop(indicies, iterator))
+		builder.indent += 1
+		#detect end of loop
+		loop_end = int(instruction.argval[len("to "):])
+		builder.indent_changes[loop_end] -= 1
+	else:
+		builder.push_invalid(instruction)
+
+def _pop_jump(builder, instruction):  # if statements and while loops
+	opname = instruction.opname
+	val = builder.pop()
+	if opname.endswith("TRUE"):
+		val = operations.unary_operation("not")(val)
+	jump_target = int(instruction.arg)
+	if builder.raw_jumps:
+		val=val.val if opname.endswith("TRUE") else operations.unary_operation("not")(val)
+		builder.push(operations.Jump(jump_target,val))
+	else:	
+		if jump_target > instruction.offset:
+			builder.indent_changes[jump_target] -= 1
+			index2 = builder.flow.index_at(jump_target - 2)
+			if index2 is not None:
+				instruction2 = builder.instructions[index2]
+				is_while = False
+				if instruction2.opname == "JUMP_ABSOLUTE" and instruction2.arg < instruction.offset:
+					#either a if statement that is last statement in a loop or a while loop
+					is_while = builder.flow.first_branch_is(builder.i, instruction2.arg)
+					if is_while:
+						#instruction before jump target jumps above us and no POP_JUMPs between;
+						# this is a while loop
+						builder.push(operations.WhileLoop(val))
+				if not is_while:  # this is a normal if
+					if opname == "POP_JUMP_IF_TRUE" and instruction2.opname == "POP_JUMP_IF_FALSE":
+						#TODO: fix if statement with "or" operators
+						pass
+					if builder.ast and isinstance(builder.peek(), operations.Else):
+						builder.pop()
+						builder.indent -= 1
+						builder.push(operations.Elif(val))
+					else:
+						builder.push(operations.If(val))
+		else:
+			# this is a if statement that is the last statement in a for loop,
+			# so it jumps directly to the top of the for loop, so we dedent the JUMP_ABSOLUTE again
+			builder.dedent_jump_to(jump_target)
+			builder.push(operations.If(val))
+		builder.indent += 1
+
+@register_handler("JUMP_ABSOLUTE")
+def _jump_absolute(builder, instruction):
+	# used for many things, including continue, break, and jumping to the top of a loop
+	#TODO: continue in while loops
+	jump_target = int(instruction.arg)
+	if builder.raw_jumps:
+		builder.push(operations.Jump(jump_target))
+	else:
+		index2 = builder.flow.index_at(jump_target)
+		if index2 is not None:
+			instruction2 = builder.instructions[index2]
+			if instruction2.opname == "FOR_ITER":
+				loop_end = int(instruction2.argval[len("to "):]) - 2
+				if loop_end != instruction.offset:  # this isn't the end of the loop, but its still jumping, so this is a "continue"
+					if not isinstance(builder.peek(), operations.Break):
+						builder.push(operations.Continue())
+				#otherwise this is a normal jump to the top of the loop, so do nothing
+			elif builder.flow.is_loop_exit(instruction2.offset):
+				#there is a loop also jumping to the same spot, so this is a "break"
+				builder.push(operations.Break())
+
+@register_handler("JUMP_FORWARD")
+def _jump_forward(builder, instruction):
+	# used to jump over the else statement from the if statement's branch
+	jump_target = int(instruction.argval[len("to "):])
+	if builder.raw_jumps:
+		builder.push(operations.Jump(jump_target))
+	else:
+		builder.indent -= 1
+		builder.push(operations.Else())
+		builder.indent += 2
+		builder.indent_changes[jump_target] -= 1
+
+@register_handler("IMPORT_NAME")
+def _import_name(builder, instruction):
+	instructions = builder.instructions
+	i = builder.i
+	fromlist = builder.pop()
+	level = int(str(builder.pop().val))  # str(), as it might be a ConstRef
+	if level == 0:  #absolute import
+		next_op = instructions[i + 1]
+		if is_store(next_op):
 			i += 1
-			if is_store(assign_op):
-				index = assign_op.argval
-				var_names.append(index)
-				push(operations.ForLoop([index], iterator))
-				indent += 1
-				#detect end of loop
-				loop_end = int(instruction.argval[len("to "):])
-				indent_changes.append((loop_end, -1))
-			elif assign_op.opname == "UNPACK_SEQUENCE":
-				# loops like for i,j in zip(x,y)
-				num_vals = assign_op.arg
-				assign_ops = instructions[i + 1:i + num_vals + 1]
-				i += num_vals  #skip all stores
-				indicies = []
-				for op in assign_ops:
-					var_name = op.argval
-					var_names.append(var_name)
-					indicies.append(var_name)
-				push(operations.ForLoop(indicies, iterator))
-				indent += 1
-				#detect end of loop
-				loop_end = int(instruction.argval[len("to "):])
-				indent_changes.append((loop_end, -1))
-			else:
-				push_invalid(instruction)
-		elif opname.startswith("POP_JUMP"):  # if statements and while loops
-			val = pop()
-			if opname.endswith("TRUE"):
-				val = operations.unary_operation("not")(val)
-			jump_target = int(instruction.arg)
-			if raw_jumps:
-				val=val.val if opname.endswith("TRUE") else operations.unary_operation("not")(val)
-				push(operations.Jump(jump_target,val))
-			else:	
-				if jump_target > instruction.offset:
-					indent_changes.append((jump_target, -1))
-					for instruction2 in instructions:
-						if instruction2.offset == jump_target - 2:
-							is_while = False
-							if instruction2.opname == "JUMP_ABSOLUTE" and instruction2.arg < instruction.offset:
-								for instruction3 in instructions:
-									if instruction3.offset > instruction.offset:
-										break
-									if instruction3.offset >= instruction2.arg and (
-										instruction3.opname.startswith("POP_JUMP") or
-										instruction3.opname == "FOR_ITER"
-									):
-										#either a if statement that is last statement in a loop or a while loop
-										is_while = instruction3.offset == instruction.offset
-										break
-								if is_while:
-									#instruction before jump target jumps above us and no POP_JUMPs between;
-									# this is a while loop
-									push(operations.WhileLoop(val))
-							if not is_while:  # this is a normal if
-								if opname == "POP_JUMP_IF_TRUE" and instruction2.opname == "POP_JUMP_IF_FALSE":
-									#TODO: fix if statement with "or" operators
-									pass
-								if ast and isinstance(peek(), operations.Else):
-									pop()
-									indent -= 1
-									push(operations.Elif(val))
-								else:
-									push(operations.If(val))
-							break
-				else:
-					# this is a if statement that is the last statement in a for loop,
-					# so it jumps directly to the top of the for loop, so we dedent the JUMP_ABSOLUTE again
-					dedent_jump_to(jump_target)
-					push(operations.If(val))
-				indent += 1
-		elif opname == "JUMP_ABSOLUTE":
-			# used for many things, including continue, break, and jumping to the top of a loop
-			#TODO: continue in while loops
-			jump_target = int(instruction.arg)
-			if raw_jumps:
-				push(operations.Jump(jump_target))
-			else:
-				for instruction2 in instructions:
-					if instruction2.offset == jump_target:
-						if instruction2.opname == "FOR_ITER":
-							loop_end = int(instruction2.argval[len("to "):]) - 2
-							if loop_end != instruction.offset:  # this isn't the end of the loop, but its still jumping, so this is a "continue"
-								if not isinstance(peek(), operations.Break):
-									push(operations.Continue())
-							#otherwise this is a normal jump to the top of the loop, so do nothing
-						else:
-							for instruction3 in instructions:
-								if (instruction3.opname == "FOR_ITER" and int(
-									instruction3.argval[len("to "):]
-								) == instruction2.offset) or (
-									instruction3.opname.startswith("POP_JUMP") and 
-									instruction3.arg == instruction2.offset
-								):
-									#there is a loop also jumping to the same spot, so this is a "break"
-									push(operations.Break())
-									break
-						break
-		elif opname == "JUMP_FORWARD":
-			# used to jump over the else statement from the if statement's branch
-			jump_target = int(instruction.argval[len("to "):])
-			if raw_jumps:
-				push(operations.Jump(jump_target))
-			else:
-				indent -= 1
-				push(operations.Else())
-				indent += 2
-				indent_changes.append((jump_target, -1))
-		elif opname == "IMPORT_NAME":
-			fromlist = pop()
-			level = int(pop().val)
-			if level == 0:  #absolute import
-				next_op = instructions[i + 1]
-				if is_store(next_op):
-					i += 1
-					alias = next_op.argval if next_op.argval != instruction.argval else None
-					push(operations.Import(instruction.argval, alias))
-				elif next_op.opname == "IMPORT_FROM":
-					names = []
-					i += 1
-					while next_op.opname == "IMPORT_FROM":
-						i += 1
-						assign_op = instructions[i]
-						names.append(assign_op.argval)
-						i += 1
-						next_op = instructions[i]
-					i -= 1
-					push(operations.FromImport(instruction.argval, names))
-				elif next_op.opname == "IMPORT_STAR":
-					i += 1
-					push(operations.FromImport(instruction.argval, [operations.Value("*")]))
-				else:
-					push_invalid(instruction)
-			else:  #TODO:relative import
-				push_invalid(instruction)
-		elif opname == "RAISE_VARARGS":
-			argc = instruction.arg
-			if argc == 0:
-				push(operations.Raise())
-			elif argc == 1:
-				push(operations.Raise(pop()))
-			else:
-				push(operations.Raise(pop(), pop()))
-		elif opname in ("CALL_FUNCTION", "CALL_METHOD"):
-			argc = int(instruction.arg)
-			args = pop_n(argc)
-			func = pop()
-			push(operations.FunctionCall(func, args))
-		elif opname == "CALL_FUNCTION_KW":
-			# top of stack is a tuple of kwarg names pushed by LOAD_CONST
-			kwarg_names = literal_eval(pop().val)
-			kwargs = {}
-			for name in kwarg_names:
-				kwargs[name] = pop()
-			argc = int(instruction.arg) - len(kwargs)
-			args = pop_n(argc)
-			func = pop()
-			push(operations.FunctionCall(func, args, kwargs))
-		elif opname == "CALL_FUNCTION_EX":
-			if instruction.arg & 1:  #lowest bit set
-				kwargs = pop()
-				args = pop()
-				func = pop()
-				push(
-					operations.FunctionCall(
-					func, [operations.UnpackSeq(args),
-					operations.UnpackDict(kwargs)]
-					)
-				)
-			else:
-				args = pop()
-				func = pop()
-				push(operations.FunctionCall(func, [operations.UnpackSeq(args)]))
-		elif opname == "MAKE_FUNCTION":  # list comps, lambdas and nested functions
-			#TODO: handle the other flags
-			flags = instruction.arg
-			pop()  # qualified name
-			code_obj = pop()
-			func_name = get_code_obj_name(code_obj.val)
-			if flags & 8:
-				closure_vars = pop().args
-				push(operations.Closure(func_name, closure_vars))
-			else:
-				push(operations.Value(func_name))
-		elif opname in ("LIST_APPEND", "SET_ADD"):  #used in comprehensions
-			func = opname[opname.index("_") + 1:].lower()
-			if is_comp:
-				push(
-					operations.FunctionCall(
-					operations.Attribute(operations.Value(temp_name), operations.Value(func)),
-					[pop()]
-					)
-				)
-			else:
-				push_invalid(instruction)
-		elif opname == "MAP_ADD":  #used in dict comprehensions
-			if is_comp:
-				key = pop()
-				val = pop()
-				push(operations.SubscriptAssign(key, operations.Value(temp_name), val))
-			else:
-				push_invalid(instruction)
-		elif opname == "UNPACK_SEQUENCE":
-			push(operations.UnpackSeq(pop()))
-		elif opname == "UNPACK_EX":  # unpacking assignment
-			num_vals_before = instruction.arg & 0xff
-			num_vals_after = (instruction.arg >> 8) & 0xff  #high byte
-			num_vals = num_vals_before + num_vals_after
-			assign_ops = []
-			for j in range(num_vals_before):
-				assign_ops.append(instructions[i + j + 1])
-			j += 1
-			assign_op = instructions[i + j + 1]
-			if is_store(assign_op):  #list unpack
-				num_vals += 1
-				assign_op.argval = "*" + assign_op.argval
-				assign_ops.append(assign_op)
-			j += 1
-			for j in range(j, j + num_vals_after):
-				assign_ops.append(instructions[i + j + 1])
-			
-			i += num_vals  #skip all stores
+			alias = next_op.argval if next_op.argval != instruction.argval else None
+			builder.push(operations.Import(instruction.argval, alias))
+		elif next_op.opname == "IMPORT_FROM":
 			names = []
-			for op in assign_ops:
-				var_name = op.argval
-				var_names.append(var_name)
-				names.append(var_name)
-			
-			push(operations.Assign(operations.build_operation("tuple")(names), pop()))
-		elif opname == "COMPARE_OP":
-			right = pop()
-			left = pop()
-			push(operations.Comparison(instruction.argval, left, right))
-		elif opname == "BINARY_SUBSCR":
-			if isinstance(peek(), operations.Slice):
-				slice_ = pop()
-				val = pop()
-				push(operations.SubscriptSlice(val, slice_.start, slice_.stop, slice_.step))
-			else:
-				subscript = pop()
-				val = pop()
-				push(operations.Subscript(val, subscript))
-		elif opname == "STORE_SUBSCR":
-			push(operations.SubscriptAssign(pop(), pop(), pop()))
-		elif opname.startswith("UNARY"):
-			operation = opname[len("UNARY_"):]
-			push(operations.unary_operation(operation)(pop()))
-		elif opname.startswith("BINARY"):
-			operation = opname[len("BINARY_"):]
-			right = pop()
-			left = pop()
-			push(operations.binary_operation(operation)(left, right))
-		elif opname.startswith("INPLACE"):
-			operation = opname[len("INPLACE_"):]
-			right = pop()
-			left = pop()
-			if is_store(instructions[i + 1]):
+			i += 1
+			while next_op.opname == "IMPORT_FROM":
 				i += 1
-				push(operations.inplace_operation(operation)(left, right))
-			else:
-				push_invalid(instruction)
-		elif opname not in ("NOP", "POP_TOP"):
-			push_invalid(instruction)
-		if i == 0 and is_comp:  #give the temporary for list comps a name
-			push(operations.Assign(operations.Value(temp_name), pop()))
-		i += 1
-	return (ast, arg_names)
+				assign_op = instructions[i]
+				names.append(assign_op.argval)
+				i += 1
+				next_op = instructions[i]
+			i -= 1
+			builder.push(operations.FromImport(instruction.argval, names))
+		elif next_op.opname == "IMPORT_STAR":
+			i += 1
+			builder.push(operations.FromImport(instruction.argval, [builder.value("*")]))
+		else:
+			builder.push_invalid(instruction)
+	else:  #TODO:relative import
+		builder.push_invalid(instruction)
+	builder.i = i
 
-def asts_to_code(asts, flags=0,tab_char="\t"):
-	""" converts an ast into python code"""
+@register_handler("RAISE_VARARGS")
+def _raise_varargs(builder, instruction):
+	argc = instruction.arg
+	if argc == 0:
+		builder.push(operations.Raise())
+	elif argc == 1:
+		builder.push(operations.Raise(builder.pop()))
+	else:
+		builder.push(operations.Raise(builder.pop(), builder.pop()))
+
+@register_handler("CALL_FUNCTION", "CALL_METHOD")
+def _call_function(builder, instruction):
+	argc = int(instruction.arg)
+	args = builder.pop_n(argc)
+	func = builder.pop()
+	builder.push(operations.FunctionCall(func, args))
+
+@register_handler("CALL_FUNCTION_KW")
+def _call_function_kw(builder, instruction):
+	# top of stack is a tuple of kwarg names pushed by LOAD_CONST
+	kwarg_names = builder.constant(builder.pop().val)
+	kwargs = {}
+	for name in kwarg_names:
+		kwargs[name] = builder.pop()
+	argc = int(instruction.arg) - len(kwargs)
+	args = builder.pop_n(argc)
+	func = builder.pop()
+	builder.push(operations.FunctionCall(func, args, kwargs))
+
+@register_handler("CALL_FUNCTION_EX")
+def _call_function_ex(builder, instruction):
+	pop = builder.pop
+	if instruction.arg & 1:  #lowest bit set
+		kwargs = pop()
+		args = pop()
+		func = pop()
+		builder.push(
+			operations.FunctionCall(
+			func, [operations.UnpackSeq(args),
+			operations.UnpackDict(kwargs)]
+			)
+		)
+	else:
+		args = pop()
+		func = pop()
+		builder.push(operations.FunctionCall(func, [operations.UnpackSeq(args)]))
+
+@register_handler("MAKE_FUNCTION")
+def _make_function(builder, instruction):  # list comps, lambdas and nested functions
+	#TODO: handle the other flags
+	flags = instruction.arg
+	builder.pop()  # qualified name
+	code_obj = builder.pop()
+	func_name = get_code_obj_name(str(code_obj.val))
+	if flags & 8:
+		closure_vars = builder.pop().args
+		builder.push(operations.Closure(func_name, closure_vars))
+	else:
+		builder.push(builder.value(func_name))
+
+@register_handler("LIST_APPEND", "SET_ADD")
+def _list_append(builder, instruction):  #used in comprehensions
+	opname = instruction.opname
+	func = opname[opname.index("_") + 1:].lower()
+	if builder.is_comp:
+		builder.push(
+			operations.FunctionCall(
+			operations.Attribute(builder.value(builder.temp_name), builder.value(func)),
+			[builder.pop()]
+			)
+		)
+	else:
+		builder.push_invalid(instruction)
+
+@register_handler("MAP_ADD")
+def _map_add(builder, instruction):  #used in dict comprehensions
+	if builder.is_comp:
+		key = builder.pop()
+		val = builder.pop()
+		builder.push(operations.SubscriptAssign(key, builder.value(builder.temp_name), val))
+	else:
+		builder.push_invalid(instruction)
+
+@register_handler("UNPACK_SEQUENCE")
+def _unpack_sequence(builder, instruction):
+	builder.push(operations.UnpackSeq(builder.pop()))
+
+@register_handler("UNPACK_EX")
+def _unpack_ex(builder, instruction):  # unpacking assignment
+	instructions = builder.instructions
+	i = builder.i
+	num_vals_before = instruction.arg & 0xff
+	num_vals_after = (instruction.arg >> 8) & 0xff  #high byte
+	num_vals = num_vals_before + num_vals_after
+	assign_ops = []
+	for j in range(num_vals_before):
+		assign_ops.append(instructions[i + j + 1])
+	j += 1
+	assign_op = instructions[i + j + 1]
+	if is_store(assign_op):  #list unpack
+		num_vals += 1
+		assign_op.argval = "*" + assign_op.argval
+		assign_ops.append(assign_op)
+	j += 1
+	for j in range(j, j + num_vals_after):
+		assign_ops.append(instructions[i + j + 1])
+	
+	builder.i += num_vals  #skip all stores
+	names = []
+	for op in assign_ops:
+		var_name = op.argval
+		builder.var_names.add(var_name)
+		names.append(var_name)
+	
+	builder.push(operations.Assign(operations.build_operation("tuple")(names), builder.pop()))
+
+@register_handler("COMPARE_OP")
+def _compare_op(builder, instruction):
+	right = builder.pop()
+	left = builder.pop()
+	builder.push(operations.Comparison(instruction.argval, left, right))
+
+@register_handler("BINARY_SUBSCR")
+def _binary_subscr(builder, instruction):
+	if isinstance(builder.peek(), operations.Slice):
+		slice_ = builder.pop()
+		val = builder.pop()
+		builder.push(operations.SubscriptSlice(val, slice_.start, slice_.stop, slice_.step))
+	else:
+		subscript = builder.pop()
+		val = builder.pop()
+		builder.push(operations.Subscript(val, subscript))
+
+@register_handler("STORE_SUBSCR")
+def _store_subscr(builder, instruction):
+	pop = builder.pop
+	builder.push(operations.SubscriptAssign(pop(), pop(), pop()))
+
+def _unary(builder, instruction):
+	operation = instruction.opname[len("UNARY_"):]
+	builder.push(operations.unary_operation(operation)(builder.pop()))
+
+def _binary(builder, instruction):
+	operation = instruction.opname[len("BINARY_"):]
+	right = builder.pop()
+	left = builder.pop()
+	builder.push(operations.binary_operation(operation)(left, right))
+
+def _inplace(builder, instruction):
+	operation = instruction.opname[len("INPLACE_"):]
+	right = builder.pop()
+	left = builder.pop()
+	if is_store(builder.instructions[builder.i + 1]):
+		builder.i += 1
+		builder.push(operations.inplace_operation(operation)(left, right))
+	else:
+		builder.push_invalid(instruction)
+
+@register_handler("NOP", "POP_TOP")
+def _nop(builder, instruction):
+	pass
+
+def _invalid(builder, instruction):
+	builder.push_invalid(instruction)
+
+# families of opnames sharing a handler, for the opnames without one of their own
+_HANDLER_PREFIXES = (
+	("LOAD", _load), ("BUILD", _build), ("POP_JUMP", _pop_jump),
+	("UNARY", _unary), ("BINARY", _binary), ("INPLACE", _inplace),
+)
+
+def _resolve_handler(opname):
+	""" returns the handler for opname, adding it to HANDLERS if it's one of a family. Anything else is invalid,
+	and isn't added, so that the opnames of damaged listings don't pile up in HANDLERS"""
+	handler = HANDLERS.get(opname)
+	if handler is None:
+		for prefix, family_handler in _HANDLER_PREFIXES:
+			if opname.startswith(prefix):
+				handler = HANDLERS[opname] = family_handler
+				break
+		else:
+			handler = _invalid
+	return handler
+
+for _opname in _all_opnames:
+	if not _opname.startswith("<"):  # unused opcodes
+		HANDLERS.setdefault(_opname, _resolve_handler(_opname))  # there's only so many real ones
+
+def instructions_to_asts(instructions, flags=0, stats=None, arg_names=None):
+	""" converts list of instruction into an AST. stats is an optional DecompileStats
+	to record the time spent in each opcode's handler in. arg_names are the function's real arguments,
+	if known; otherwise they're inferred from the names loaded before being assigned"""
+	builder = AstBuilder(instructions, flags, stats, arg_names)
+	is_comp = builder.is_comp
+	indent_changes = builder.indent_changes
+	handlers = HANDLERS
+	while builder.i < len(instructions):
+		instruction = builder.instruction = instructions[builder.i]
+		opname = instruction.opname
+		if stats is not None:
+			start = perf_counter()
+		if indent_changes:
+			builder.indent += indent_changes.pop(instruction.offset, 0)
+		handler = handlers.get(opname) or _resolve_handler(opname)
+		handler(builder, instruction)
+		if builder.i == 0 and is_comp:  #give the temporary for list comps a name
+			builder.push(operations.Assign(builder.value(builder.temp_name), builder.pop()))
+		if stats is not None:
+			stats.add_opcode(opname, perf_counter() - start)
+		builder.i += 1
+	return (builder.ast, builder.arg_names)
+
+def _emit_lines(emitter, asts, flags, tab_char):
+	""" renders each statement of asts into emitter as a line, yielding after each one"""
 	if flags& RAW_JUMPS:
 		max_offset_len = len(str(asts[-1][2]))
-		return "\n".join(str(offset).ljust(max_offset_len," ")  + tab_char * (indent + 1) + str(ast) for indent, ast, offset in asts)
+		for indent, ast, offset in asts:
+			emitter.emit(str(offset).ljust(max_offset_len," ")  + tab_char * (indent + 1), ast, "\n")
+			yield
 	else:
-		return "\n".join(tab_char * indent + str(ast) for indent, ast in asts)
+		for indent, ast in asts:
+			emitter.emit(tab_char * indent, ast, "\n")
+			yield
 
-def decompile(disasm, flags=0, tab_char="\t"):
-	instructions = dis_to_instructions(disasm)
-	asts, arg_names = instructions_to_asts(instructions, flags)
-	return asts_to_code(asts, flags,tab_char), arg_names
+def asts_to_code(asts, flags=0,tab_char="\t"):
+	""" converts an ast into python code"""
+	# every statement is written into one buffer, so nested expressions aren't copied at each level
+	emitter = operations.CodeEmitter()
+	for _ in _emit_lines(emitter, asts, flags, tab_char):
+		pass
+	return emitter.getvalue()[:-1]  # no newline after the last statement
+
+def write_code(fp, asts, flags=0, tab_char="\t", indent=""):
+	""" like asts_to_code, but writes each line to fp as soon as it's rendered, starting with indent
+	and ending with a newline"""
+	emitter = operations.CodeEmitter()
+	buffer = emitter.buffer  # kept whole, since operations seen again are copied out of it
+	written = 0
+	for _ in _emit_lines(emitter, asts, flags, tab_char):
+		if emitter.large:  # written a part at a time, so that a large literal isn't copied into the line first
+			emitter.large = False
+			fp.write(indent)
+			for part in buffer[written:-1]:
+				fp.write(part.replace("\n", "\n" + indent) if "\n" in part else part)
+			fp.write("\n")
+			written = len(buffer)
+			continue
+		line = "".join(buffer[written:])
+		written = len(buffer)
+		if "\n" in line[:-1]:  # a statement spanning several lines, which all get the indent
+			line = line[:-1].replace("\n", "\n" + indent) + "\n"
+		fp.write(indent + line)
+	if not asts:  # what asts_to_code gives is still one (empty) line
+		fp.write(indent + "\n")
+
+def decompile_instructions(instructions, flags=0, tab_char="\t", stats=None, arg_names=None):
+	if stats is None:
+		asts, arg_names = instructions_to_asts(instructions, flags, arg_names=arg_names)
+		return asts_to_code(asts, flags,tab_char), arg_names
+	with stats.stage("instructions_to_asts"):
+		asts, arg_names = instructions_to_asts(instructions, flags, stats, arg_names)
+	with stats.stage("asts_to_code"):
+		code = asts_to_code(asts, flags, tab_char)
+	return code, arg_names
+
+def decompile(disasm, flags=0, tab_char="\t", stats=None):
+	parse = dis_to_instruction_table if len(disasm) > TABLE_THRESHOLD else dis_to_instructions
+	if stats is None:
+		return decompile_instructions(parse(disasm), flags, tab_char)
+	with stats.stage("dis_to_instructions"):
+		instructions = parse(disasm)
+	return decompile_instructions(instructions, flags, tab_char, stats)
+
+_func_header_pattern = r"Disassembly of (.+):"
+
+def _func_name(header_name):
+	if header_name.startswith("<"):
+		return get_code_obj_name(header_name)
+	else:
+		return header_name
 
 def split_funcs(disasm):
 	""" splits out comprehensions from the main func or functions from the module"""
@@ -447,14 +821,10 @@ def split_funcs(disasm):
 	names = []
 	if not disasm.startswith("Disassembly"):
 		names.append("main")
-	for match in re.finditer(r"Disassembly of (.+):", disasm):
+	for match in _compile(_func_header_pattern).finditer(disasm):
 		end_positions.append(match.start())
 		start_positions.append(match.end())
-		name = match.group(1)
-		if name.startswith("<"):
-			names.append(get_code_obj_name(name))
-		else:
-			names.append(name)
+		names.append(_func_name(match.group(1)))
 	end_positions.append(len(disasm))
 	if disasm.startswith("Disassembly"):
 		start_positions.pop(0)
@@ -462,6 +832,39 @@ def split_funcs(disasm):
 	for start, end, name in zip(start_positions, end_positions, names):
 		yield (name, disasm[start:end])
 
+def split_funcs_stream(lines):
+	""" like split_funcs, but lazily consumes an iterable of lines (eg. a file object),
+	only holding on to the function currently being read"""
+	lines = iter(lines)
+	first_line = ""
+	for line in lines:  # leading whitespace is ignored, like split_funcs on stripped input
+		if line.strip():
+			first_line = line.lstrip()
+			break
+	name = None if first_line.startswith("Disassembly") else "main"
+	func_lines = []
+	func_header_re = _compile(_func_header_pattern)
+	for line in chain((first_line, ), lines):
+		match = func_header_re.search(line)
+		if match is None:
+			func_lines.append(line)
+			continue
+		func_lines.append(line[:match.start()])
+		if name is not None:
+			yield (name, "".join(func_lines))
+		name = _func_name(match.group(1))
+		func_lines = [line[match.end():]]
+	if name is not None:
+		yield (name, "".join(func_lines))
+
+def split_code(code, name="main"):
+	""" like split_funcs, but walks a code object and the code objects nested in it, in the same
+	order dis.dis prints them"""
+	yield (name, code)
+	for const in code.co_consts:
+		if isinstance(const, CodeType):
+			yield from split_code(const, get_code_obj_name(repr(const)))
+
 def get_flags(name):
 	if name.startswith("genexpr"):
 		return GEN_EXPR
@@ -470,16 +873,334 @@ def get_flags(name):
 	else:
 		return 0
 
-def decompile_all(disasm,flags=0,tab_char="\t"):
-	disasm = re.sub(r"^#.*\n?", "", disasm, re.MULTILINE).strip()  # ignore comments
-	for name, func in split_funcs(disasm):
-		yield name, *decompile(func, get_flags(name)|flags, tab_char)
-
-def pretty_decompile(disasm,flags=0,tab_char="\t"):
-	ret = []
-	for name, code, arg_names in decompile_all(disasm, flags, tab_char):
-		ret.append(
-			f"def {name}({','.join(arg_names)}):\n" +
-			"\n".join(tab_char + line for line in code.split("\n"))
+def _decompile_func(name, func, flags, tab_char, stats):
+	if stats is None:
+		return decompile(func, flags, tab_char)
+	with stats.function(name):
+		return decompile(func, flags, tab_char, stats)
+
+def _decompile_batch(batch, flags, tab_char, profile=False):
+	""" returns the results for batch, and the DecompileStats recorded in this worker if profile is set"""
+	stats = None
+	if profile:
+		from .stats import DecompileStats
+		stats = DecompileStats()
+	return [_decompile_func(name, func, get_flags(name)|flags, tab_char, stats) for name, func in batch], stats
+
+def _batches(funcs, batch_size):
+	batch = []
+	size = 0
+	for name, func in funcs:
+		batch.append((name, func))
+		size += len(func)
+		if size >= batch_size:
+			yield batch
+			batch = []
+			size = 0
+	if batch:
+		yield batch
+
+def _finish_batch(batch, cached, future, flags, tab_char, cache, stats):
+	decompiled = iter(())
+	if future is not None:
+		results, worker_stats = future.result()
+		decompiled = iter(results)
+		if worker_stats is not None:
+			stats.merge(worker_stats)
+	for (name, func), result in zip(batch, cached):
+		if result is None:
+			result = next(decompiled)
+			if cache is not None:
+				cache.put(func, get_flags(name)|flags, tab_char, result)
+		yield name, *result
+
+def _num_workers(executor):
+	""" how many processes executor has, for sizing batches. Executors don't say, other than privately"""
+	return getattr(executor, "_max_workers", None) or os.cpu_count() or 1
+
+def _batch_size(total_size, num_workers):
+	if total_size is None:
+		return BATCH_SIZE
+	return min(BATCH_SIZE, total_size // (4 * num_workers) + 1)  # small inputs are still spread over every worker
+
+def _submit_batch(executor, batch, flags, tab_char, cache, stats):
+	""" sends the functions of batch that aren't in the cache to executor, returning what _finish_batch takes.
+	The cache is only used from this process"""
+	if cache is None:
+		cached = [None] * len(batch)
+	else:
+		cached = [cache.get(func, get_flags(name)|flags, tab_char) for name, func in batch]
+	misses = [entry for entry, result in zip(batch, cached) if result is None]
+	future = executor.submit(_decompile_batch, misses, flags, tab_char, stats is not None) if misses else None
+	return batch, cached, future
+
+def _decompile_batches(executor, num_workers, funcs, flags, tab_char, total_size, cache, stats):
+	# results are yielded in order, with only a few batches per worker in flight
+	pending = deque()
+	for batch in _batches(funcs, _batch_size(total_size, num_workers)):
+		pending.append(_submit_batch(executor, batch, flags, tab_char, cache, stats))
+		if len(pending) > 2 * num_workers:
+			yield from _finish_batch(*pending.popleft(), flags, tab_char, cache, stats)
+	while pending:
+		yield from _finish_batch(*pending.popleft(), flags, tab_char, cache, stats)
+
+def _decompile_inputs(inputs, flags, tab_char, workers=None, cache=None, stats=None):
+	""" decompiles several inputs, yielding (key, [(name, code, arg_names)], error) for each in order, where
+	error is the exception that stopped that input (and the list is None), or None. inputs yields (key, listing)
+	pairs, where listing() is a context manager giving the input's (name, disassembly) pairs and their total size
+	(or None). With worker processes, the next inputs are sent to them while the earlier ones are still being
+	decompiled, so that lots of small inputs keep every worker busy too"""
+	if workers is not None and not hasattr(workers, "submit") and workers > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(workers) as executor:
+			yield from _decompile_inputs(inputs, flags, tab_char, executor, cache, stats)
+		return
+	if not hasattr(workers, "submit") or flags & (DEDUPE | SHARED_HELPERS):
+		# one at a time, as deduping needs all of an input before deciding what to decompile
+		for key, listing in inputs:
+			try:
+				with listing() as (funcs, total_size):
+					results = list(_decompile_funcs(funcs, flags, tab_char, workers, total_size, cache, stats))
+			except Exception as e:  # pylint: disable=broad-except
+				yield key, None, e
+				continue
+			yield key, results, None
+		return
+	num_workers = _num_workers(workers)
+	outputs = deque()  # [key, results, error] of the inputs not yielded yet, in order
+	pending = deque()  # (output, batch, cached, future) across every input, in order
+	
+	def finish_batch():
+		output, batch, cached, future = pending.popleft()
+		if output[2] is not None:  # the input has already failed
+			if future is not None:
+				future.cancel()
+			return
+		try:
+			output[1].extend(_finish_batch(batch, cached, future, flags, tab_char, cache, stats))
+		except Exception as e:  # pylint: disable=broad-except
+			output[2] = e
+	
+	def finished_outputs():
+		# an input is finished once all of it was read and none of its batches are pending
+		while outputs and (len(outputs) > 1 or not reading) and not (pending and pending[0][0] is outputs[0]):
+			key, results, error = outputs.popleft()
+			yield key, None if error is not None else results, error
+	
+	for key, listing in inputs:
+		output = [key, [], None]
+		outputs.append(output)
+		reading = True
+		try:
+			with listing() as (funcs, total_size):
+				for batch in _batches(funcs, _batch_size(total_size, num_workers)):
+					pending.append((output, *_submit_batch(workers, batch, flags, tab_char, cache, stats)))
+					while len(pending) > 2 * num_workers:
+						finish_batch()
+		except Exception as e:  # pylint: disable=broad-except
+			output[2] = e
+		reading = False
+		yield from finished_outputs()
+	while pending:
+		finish_batch()
+		yield from finished_outputs()
+
+# a reference to a code object in the argval of a LOAD_CONST
+_code_obj_pattern = r"<code object <?[^\s>]*>? at 0x[0-9a-f]+, file \"[^\"\n]*\", line \d+>"
+# the line number column (and the indentation) in front of an instruction
+_line_num_pattern = r"^[^\S\n]*(?:\d+[^\S\n]+(?=(?:>>[^\S\n]+)?\d+ [A-Z_]))?"
+# names of functions made from code objects, as get_code_obj_name returns them. Operations can
+# render right up against a name (eg. "notlistcomp_0x..."), so this may include some of what's before it
+_code_obj_name_pattern = r"\w+_0x([0-9a-f]+)\b"
+# a function name that get_code_obj_name made, as opposed to one from a "Disassembly of name:" header
+_code_obj_func_pattern = r".*_0x[0-9a-f]+"
+
+def _body_key(name, func):
+	""" what two functions need to have in common to decompile to the same code: the flags their
+	name gives them and their instructions. Line numbers and whitespace are ignored"""
+	lines = _compile(_line_num_pattern, re.MULTILINE).sub("", func).split("\n")
+	return get_flags(name), "\n".join(line.rstrip() for line in lines if line.strip())
+
+def _decompile_deduped(funcs, flags, tab_char, workers, total_size, cache, stats):
+	""" like _decompile_funcs, but only decompiles the first of any identical function bodies and
+	reuses its result for the rest"""
+	order = deque()  # (name, key) of the functions read but not yielded yet
+	unique_keys = deque()  # keys of the functions passed on to be decompiled, in order
+	results = {}  # key -> (code, arg_names)
+	
+	def unique_funcs():
+		seen = set()
+		for name, func in funcs:
+			key = _body_key(name, func)
+			order.append((name, key))
+			if key not in seen:
+				seen.add(key)
+				unique_keys.append(key)
+				yield name, func
+	
+	for _, *result in _decompile_funcs(unique_funcs(), flags, tab_char, workers, total_size, cache, stats):
+		results[unique_keys.popleft()] = result
+		while order and order[0][1] in results:
+			name, key = order.popleft()
+			yield name, *results[key]
+	for name, key in order:  # duplicates read after the last distinct function
+		yield name, *results[key]
+
+def _decompile_shared(funcs, flags, tab_char, workers, total_size, cache, stats):
+	""" decompiles only the first function of each group of identical ones, renaming references
+	to the others to it. Functions that only differ in which of two identical code objects they
+	use are identical too. Only code objects are grouped: named functions can be called by name from
+	elsewhere, so they're always output as themselves"""
+	funcs = list(funcs)
+	code_obj_re = _compile(_code_obj_pattern)
+	code_obj_func_re = _compile(_code_obj_func_pattern)
+	group_of = {}  # function name -> index of its group of identical functions
+	groups = {}  # key -> index of the group
+	# nested code objects come after the function using them, so going backwards every
+	# code object referenced has already been put in its group
+	for name, func in reversed(funcs):
+		def group_ref(match):
+			group = group_of.get(get_code_obj_name(match.group(0)))
+			return match.group(0) if group is None else f"<code object {group}>"
+		
+		if code_obj_func_re.fullmatch(name) is None:  # a group of its own
+			key = (None, name)
+		else:
+			key = _body_key(name, code_obj_re.sub(group_ref, func))
+		group_of[name] = groups.setdefault(key, len(groups))
+	first_of_group = {}
+	for name, _ in funcs:
+		first_of_group.setdefault(group_of[name], name)
+	aliases = {name: first_of_group[group] for name, group in group_of.items()}
+	# address -> (name, the name it's renamed to)
+	renames = {name[name.rindex("_0x") + 3:]: (name, alias) for name, alias in aliases.items() if alias != name}
+	
+	def rename(match):
+		token = match.group(0)
+		name, alias = renames.get(match.group(1), (None, None))
+		if name is None or not token.endswith(name):
+			return token
+		return token[:-len(name)] + alias
+	
+	firsts = [(name, func) for name, func in funcs if aliases[name] == name]
+	code_obj_name_re = _compile(_code_obj_name_pattern)
+	for name, code, arg_names in _decompile_funcs(firsts, flags, tab_char, workers, total_size, cache, stats):
+		yield name, code_obj_name_re.sub(rename, code), arg_names
+
+def _decompile_funcs(funcs, flags, tab_char, workers=None, total_size=None, cache=None, stats=None):
+	""" decompiles (name, disassembly) pairs in order. workers is either a number of worker
+	processes to spread the functions over, or an existing executor to share. cache is an
+	optional DecompileCache, and stats an optional DecompileStats"""
+	if flags & (DEDUPE | SHARED_HELPERS):
+		dedupe = _decompile_shared if flags & SHARED_HELPERS else _decompile_deduped
+		yield from dedupe(funcs, flags & ~(DEDUPE | SHARED_HELPERS), tab_char, workers, total_size, cache, stats)
+		return
+	if stats is not None:
+		funcs = stats.timed("split_funcs", funcs)
+	if hasattr(workers, "submit"):  # an Executor
+		yield from _decompile_batches(workers, _num_workers(workers), funcs, flags, tab_char, total_size, cache, stats)
+	elif workers is not None and workers > 1:
+		from concurrent.futures import ProcessPoolExecutor
+		with ProcessPoolExecutor(workers) as executor:
+			yield from _decompile_batches(executor, workers, funcs, flags, tab_char, total_size, cache, stats)
+	else:
+		for name, func in funcs:
+			func_flags = get_flags(name)|flags
+			result = None if cache is None else cache.get(func, func_flags, tab_char)
+			if result is None:
+				result = _decompile_func(name, func, func_flags, tab_char, stats)
+				if cache is not None:
+					cache.put(func, func_flags, tab_char, result)
+			yield name, *result
+
+def strip_comments(disasm):
+	return re.sub(r"^#.*\n?", "", disasm, re.MULTILINE).strip()
+
+def decompile_all(disasm,flags=0,tab_char="\t",workers=None,cache=None,stats=None):
+	disasm = strip_comments(disasm)
+	yield from _decompile_funcs(split_funcs(disasm), flags, tab_char, workers, len(disasm), cache, stats)
+
+def _stream_funcs(fp):
+	lines = iter(fp)
+	first_line = next(lines, "")
+	if not first_line.startswith("#"):  # ignore comments
+		lines = chain((first_line, ), lines)
+	return split_funcs_stream(lines)
+
+def decompile_stream(fp, flags=0, tab_char="\t", workers=None, cache=None, stats=None):
+	""" like decompile_all, but reads the disassembly line by line from a file-like object
+	and yields each function as soon as it has been read"""
+	yield from _decompile_funcs(_stream_funcs(fp), flags, tab_char, workers, cache=cache, stats=stats)
+
+def decompile_code(code, flags=0, tab_char="\t", stats=None):
+	""" like decompile_all, but takes a code object (or a function) instead of its disassembly.
+	The arguments come from the code object instead of being inferred. This only works on python 3.8: on any
+	other version, the code object has bytecode the handlers don't understand, so it always raises
+	UnsupportedBytecodeError (which is all the tests can check there)"""
+	if sys.version_info[:2] != BYTECODE_VERSION:
+		running, supported = (".".join(map(str, version)) for version in (sys.version_info[:2], BYTECODE_VERSION))
+		raise UnsupportedBytecodeError(
+			f"decompile_code only understands python {supported} bytecode, not {running}: "
+			f"disassemble the code on python {supported} and use decompile_all instead"
 		)
-	return "\n".join(ret)
+	code = getattr(code, "__func__", code)  # bound methods
+	code = getattr(code, "__code__", code)
+	return _decompile_code(code, flags, tab_char, stats)
+
+def _decompile_code(code, flags, tab_char, stats):
+	for name, func in split_code(code):
+		func_flags = get_flags(name)|flags
+		arg_names = code_arg_names(func, func_flags)
+		if stats is None:
+			yield name, *decompile_instructions(code_to_instructions(func), func_flags, tab_char, arg_names=arg_names)
+			continue
+		with stats.function(name):
+			with stats.stage("code_to_instructions"):
+				instructions = code_to_instructions(func)
+			result = decompile_instructions(instructions, func_flags, tab_char, stats, arg_names)
+		yield name, *result
+
+def format_function(name, code, arg_names, tab_char="\t"):
+	return f"def {name}({','.join(arg_names)}):\n" + "\n".join(tab_char + line for line in code.split("\n"))
+
+def _write_func(fp, name, func, flags, tab_char, stats):
+	""" decompiles one function straight into fp, without building its code as a string"""
+	parse = dis_to_instruction_table if len(func) > TABLE_THRESHOLD else dis_to_instructions
+	if stats is None:
+		asts, arg_names = instructions_to_asts(parse(func), flags)
+		fp.write(f"def {name}({','.join(arg_names)}):\n")
+		write_code(fp, asts, flags, tab_char, tab_char)
+		return
+	with stats.function(name):
+		with stats.stage("dis_to_instructions"):
+			instructions = parse(func)
+		with stats.stage("instructions_to_asts"):
+			asts, arg_names = instructions_to_asts(instructions, flags, stats)
+		with stats.stage("asts_to_code"):
+			fp.write(f"def {name}({','.join(arg_names)}):\n")
+			write_code(fp, asts, flags, tab_char, tab_char)
+
+def write_functions(fp, funcs, flags=0, tab_char="\t", workers=None, cache=None, stats=None, total_size=None):
+	""" decompiles (name, disassembly) pairs, eg. from split_funcs, writing each function to the file-like fp
+	as it's rendered, the way pretty_decompile formats them (plus a newline after the last one).
+	Functions decompiled by worker processes or found in the cache are written once they're ready instead"""
+	if cache is not None or flags & (DEDUPE | SHARED_HELPERS) or hasattr(workers, "submit") or (workers or 1) > 1:
+		for name, code, arg_names in _decompile_funcs(funcs, flags, tab_char, workers, total_size, cache, stats):
+			fp.write(format_function(name, code, arg_names, tab_char))
+			fp.write("\n")
+		return
+	if stats is not None:
+		funcs = stats.timed("split_funcs", funcs)
+	for name, func in funcs:
+		_write_func(fp, name, func, get_flags(name)|flags, tab_char, stats)
+
+def pretty_decompile_to(fp, disasm, flags=0, tab_char="\t", workers=None, cache=None, stats=None):
+	""" like pretty_decompile, but writes the code to the file-like fp as it's rendered instead of returning it"""
+	disasm = strip_comments(disasm)
+	write_functions(fp, split_funcs(disasm), flags, tab_char, workers, cache, stats, len(disasm))
+
+def pretty_decompile(disasm,flags=0,tab_char="\t",workers=None,cache=None,stats=None):
+	from io import StringIO
+	out = StringIO()
+	pretty_decompile_to(out, disasm, flags, tab_char, workers, cache, stats)
+	return out.getvalue()[:-1]  # no newline after the last function
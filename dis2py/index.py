@@ -0,0 +1,172 @@
+""" random access to the functions of large listings. The listing is memory mapped and scanned once for
+its "Disassembly of ..." headers, giving the byte range of each function, and that index can be saved
+next to the listing so later runs skip the scan"""
+import json
+import mmap
+import os
+from contextlib import contextmanager
+from pathlib import Path
+
+from .dis2py import _code_obj_pattern, _compile, _decompile_funcs, _func_header_pattern, _func_name
+
+# bump whenever the layout of the saved index changes
+INDEX_VERSION = 1
+INDEX_SUFFIX = ".d2pidx"
+
+def index_path(path):
+	""" where the index of the listing at path is saved"""
+	return Path(str(path) + INDEX_SUFFIX)
+
+@contextmanager
+def map_file(path):
+	""" the contents of the file at path as a read only mmap, or b"" for an empty file (which can't be mapped)"""
+	with open(path, "rb") as f:
+		if os.fstat(f.fileno()).st_size == 0:
+			yield b""
+			return
+		with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+			yield data
+
+class FunctionNotFound(KeyError):
+	""" raised by FunctionIndex.find for a name that isn't in the listing"""
+
+class FunctionIndex:
+	""" the name and byte range of the disassembly of each function in a listing, in the order they appear.
+	The ranges exclude the "Disassembly of ...:" headers, so they're what split_funcs yields"""
+	def __init__(self, functions, size=None, mtime_ns=None):
+		self.functions = functions  # [(name, start, end)]
+		self.size = size
+		self.mtime_ns = mtime_ns  # of the listing, to notice when it changes
+		self.positions = {}  # name -> index in functions
+		for i, (name, _, _) in enumerate(functions):
+			self.positions.setdefault(name, i)
+	
+	@classmethod
+	def build(cls, data, size=None, mtime_ns=None):
+		""" scans data, a bytes-like listing (eg. a mmap), for its functions"""
+		start = 0
+		if data[:1] == b"#":  # a comment, which decompile_all ignores
+			newline = data.find(b"\n")
+			start = len(data) if newline == -1 else newline + 1
+		while start < len(data) and data[start:start + 1].isspace():
+			start += 1
+		functions = []
+		name = None if data[start:start + len(b"Disassembly")] == b"Disassembly" else "main"
+		for match in _compile(_func_header_pattern.encode()).finditer(data, start):
+			if name is not None:
+				functions.append((name, start, match.start()))
+			name = _func_name(match.group(1).decode())
+			start = match.end()
+		if name is not None:
+			functions.append((name, start, len(data)))
+		return cls(functions, len(data) if size is None else size, mtime_ns)
+	
+	@classmethod
+	def for_file(cls, path, data, save=False):
+		""" the index of the listing at path, whose contents are data. A saved index is used if it's up to date,
+		otherwise data is scanned, and the result saved if save is true"""
+		stat = os.stat(path)
+		index = cls.load(index_path(path))
+		if index is not None and index.size == stat.st_size and index.mtime_ns == stat.st_mtime_ns:
+			return index
+		index = cls.build(data, stat.st_size, stat.st_mtime_ns)
+		if save:
+			try:
+				index.save(index_path(path))
+			except OSError:  # eg. a read only directory, which just means scanning again next time
+				pass
+		return index
+	
+	@classmethod
+	def load(cls, path):
+		""" reads an index saved by save, returning None if there isn't a usable one"""
+		try:
+			with open(path) as f:
+				saved = json.load(f)
+			if saved["version"] != INDEX_VERSION:
+				return None
+			return cls([tuple(entry) for entry in saved["functions"]], saved["size"], saved["mtime_ns"])
+		except (OSError, ValueError, KeyError, TypeError):
+			return None
+	
+	def save(self, path):
+		path = Path(path)
+		temp_path = path.with_name(path.name + ".tmp")
+		with open(temp_path, "w") as f:
+			json.dump({
+				"version": INDEX_VERSION, "size": self.size, "mtime_ns": self.mtime_ns, "functions": self.functions
+			}, f)
+		os.replace(temp_path, path)  # so a reader never sees half of it
+	
+	def __len__(self):
+		return len(self.functions)
+	
+	def __contains__(self, name):
+		return name in self.positions
+	
+	def names(self):
+		return [name for name, _, _ in self.functions]
+	
+	def find(self, name):
+		""" the position of the function called name. Code objects can also be found by their name without
+		the address, as long as that's unambiguous"""
+		position = self.positions.get(name)
+		if position is not None:
+			return position
+		matches = [i for i, (other, _, _) in enumerate(self.functions) if other.startswith(name + "_0x")]
+		if len(matches) != 1:
+			raise FunctionNotFound(name if not matches else f"{name} is ambiguous: {len(matches)} functions match")
+		return matches[0]
+	
+	def read(self, data, position):
+		""" the (name, disassembly) of the function at position"""
+		name, start, end = self.functions[position]
+		return name, str(data[start:end], "utf-8")
+	
+	def read_all(self, data):
+		for position in range(len(self.functions)):
+			yield self.read(data, position)
+	
+	def read_function(self, data, name):
+		""" the (name, disassembly) of the function called name and of the code objects it
+		(recursively) creates, in the order they appear in the listing"""
+		code_obj_re = _compile(_code_obj_pattern)
+		found = {}  # position -> (name, disassembly)
+		pending = [self.find(name)]
+		while pending:
+			position = pending.pop()
+			if position in found:
+				continue
+			found[position] = func = self.read(data, position)
+			for match in code_obj_re.finditer(func[1]):
+				child = self.positions.get(_func_name(match.group()))
+				if child is not None:
+					pending.append(child)
+		return [found[position] for position in sorted(found)]
+
+@contextmanager
+def open_listing(path, functions=None, save_index=False):
+	""" the (name, disassembly) pairs of the listing at path, and their total size, as decompile_file reads them.
+	With functions, only the functions with those names and the ones nested in them are read, after checking
+	that they're all there"""
+	with map_file(path) as data:
+		index = FunctionIndex.for_file(path, data, save_index)
+		if not functions:
+			yield index.read_all(data), len(data)
+			return
+		for name in functions:  # so that a missing one is reported before anything is decompiled
+			index.find(name)
+		funcs = [func for name in functions for func in index.read_function(data, name)]
+		yield funcs, sum(len(func) for _, func in funcs)
+
+def decompile_file(path, flags=0, tab_char="\t", workers=None, cache=None, stats=None, save_index=False, functions=None):
+	""" like decompile_all, but memory maps the listing at path instead of reading it into a string.
+	With functions, only the functions with those names are decompiled, like decompile_function does"""
+	with open_listing(path, functions, save_index) as (funcs, total_size):
+		yield from _decompile_funcs(funcs, flags, tab_char, workers, total_size, cache, stats)
+
+def decompile_function(path, name, flags=0, tab_char="\t", cache=None, stats=None, save_index=True):
+	""" decompiles just the function called name, and the comprehensions, lambdas and functions nested in it,
+	from the listing at path, returning [(name, code, arg_names)] like decompile_all. Only their parts of the
+	listing are read, once the listing has been indexed (which is saved next to it, unless save_index is false)"""
+	return list(decompile_file(path, flags, tab_char, cache=cache, stats=stats, save_index=save_index, functions=[name]))
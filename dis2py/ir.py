@@ -0,0 +1,287 @@
+""" a versioned binary encoding of the decompiler's intermediate representation: lists of Instruction,
+InstructionTables, and the (indent, operation[, offset]) entries instructions_to_asts returns.
+Everything is walked with an explicit stack, so deeply nested expressions don't hit the recursion limit"""
+import sys
+from array import array
+
+from . import operations
+from .dis2py import Instruction, InstructionTable
+
+MAGIC = b"dis2py\0"
+# bump whenever the encoding or the fields of an operation change
+IR_VERSION = 2
+
+# operation classes are encoded as their index in this tuple, so only ever append to it
+OPERATION_TYPES = (
+	operations.Invalid, operations.Value, operations.Assign, operations.SubscriptAssign, operations.Return,
+	operations.Yield, operations.ForLoop, operations.WhileLoop, operations.If, operations.Elif, operations.Else,
+	operations.Break, operations.Continue, operations.Import, operations.FromImport, operations.Raise,
+	operations.Jump, operations.BuildOperation, operations.BuildMap, operations.FunctionCall,
+	operations.Closure, operations.Attribute, operations.Iter, operations.UnpackSeq, operations.UnpackDict,
+	operations.Slice, operations.SubscriptSlice, operations.Subscript, operations.Comparison,
+	operations.UnaryOperation, operations.BinaryOperation, operations.InplaceOperation,
+)
+_operation_ids = {cls: i for i, cls in enumerate(OPERATION_TYPES)}
+
+# tags starting each encoded value
+_NONE = 0
+_TRUE = 1
+_FALSE = 2
+_INT = 3  # varint
+_NEG_INT = 4  # varint of the negated value
+_STR = 5  # varint length, utf-8 bytes. Added to the string table
+_STR_REF = 6  # varint index into the string table
+_LIST = 7  # varint count, items
+_TUPLE = 8  # varint count, items
+_DICT = 9  # varint count, keys and values alternating
+_OPERATION = 10  # varint index into OPERATION_TYPES, then the value of each slot. Added to the node table
+_OPERATION_REF = 11  # varint index into the node table, for operations that occur more than once
+_INSTRUCTION = 12  # its five fields
+_TABLE = 13  # varint count, the raw little endian columns, the opnames its opcodes index, then argvals
+_INSTRUCTION_LIST = 14  # a list of Instructions, stored like a _TABLE since that decodes much faster
+
+# typecodes of the InstructionTable columns stored as raw bytes, in order. None is for the opcodes, which
+# are usually "H" but can be wider, so their typecode comes first as one byte
+_TABLE_COLUMNS = (("line_nums", "i"), ("offsets", "i"), ("opcodes", None), ("args", "q"))
+
+def _write_varint(out, n):
+	while n >= 0x80:
+		out.append(n & 0x7f | 0x80)
+		n >>= 7
+	out.append(n)
+
+def _read_varint(data, pos):
+	n = 0
+	shift = 0
+	while True:
+		byte = data[pos]
+		pos += 1
+		n |= (byte & 0x7f) << shift
+		if byte < 0x80:
+			return n, pos
+		shift += 7
+
+def _read_bytes(data, pos, length):
+	""" the length bytes at pos, and the position after them"""
+	end = pos + length
+	if end > len(data):
+		raise ValueError("bad dis2py IR: truncated")
+	return data[pos:end], end
+
+def _write_table(out, table):
+	_write_varint(out, len(table))
+	for column, typecode in _TABLE_COLUMNS:
+		values = getattr(table, column)
+		if typecode is None:
+			out.append(ord(values.typecode))
+		if sys.byteorder == "big":
+			values = array(values.typecode, values)
+			values.byteswap()
+		out += values.tobytes()
+	_write_varint(out, len(table.opnames))
+	for opname in table.opnames:
+		encoded = opname.encode()
+		_write_varint(out, len(encoded))
+		out += encoded
+
+def _read_table(data, pos):
+	""" returns the table, without its argvals, and the position after it"""
+	table = InstructionTable()
+	count, pos = _read_varint(data, pos)
+	for column, typecode in _TABLE_COLUMNS:
+		if typecode is None:
+			typecode = chr(data[pos])
+			pos += 1
+			if typecode not in ("H", "I"):
+				raise ValueError(f"bad dis2py IR: opcodes of type {typecode!r}")
+		values = array(typecode)
+		column_data, pos = _read_bytes(data, pos, count * values.itemsize)
+		values.frombytes(column_data)
+		if sys.byteorder == "big":
+			values.byteswap()
+		setattr(table, column, values)
+	num_opnames, pos = _read_varint(data, pos)
+	for _ in range(num_opnames):
+		length, pos = _read_varint(data, pos)
+		opname, pos = _read_bytes(data, pos, length)
+		table.opname_code(str(opname, "utf-8"))
+	if len(table.opnames) != num_opnames or max(table.opcodes, default=-1) >= num_opnames:
+		raise ValueError("bad dis2py IR: opcodes without an opname")
+	return table, pos
+
+def dumps(obj):
+	""" encodes obj, which may be made of None, bools, ints, strs, lists, tuples, dicts, operations,
+	Instructions and InstructionTables"""
+	out = bytearray(MAGIC)
+	_write_varint(out, IR_VERSION)
+	strings = {}  # str -> index in the string table
+	nodes = {}  # id(operation) -> index in the node table
+	stack = [obj]
+	pop = stack.pop
+	push = stack.extend
+	while stack:
+		item = pop()
+		item_type = type(item)
+		if item is None:
+			out.append(_NONE)
+		elif item_type is str:
+			index = strings.get(item)
+			if index is None:
+				strings[item] = len(strings)
+				encoded = item.encode()
+				out.append(_STR)
+				_write_varint(out, len(encoded))
+				out += encoded
+			else:
+				out.append(_STR_REF)
+				_write_varint(out, index)
+		elif item_type is bool:
+			out.append(_TRUE if item else _FALSE)
+		elif item_type is int:
+			if item >= 0:
+				out.append(_INT)
+				_write_varint(out, item)
+			else:
+				out.append(_NEG_INT)
+				_write_varint(out, -item)
+		elif item_type is list and item and all(type(entry) is Instruction for entry in item):
+			out.append(_INSTRUCTION_LIST)
+			table = InstructionTable(item)
+			_write_table(out, table)
+			stack.append(table.argvals)
+		elif item_type is list or item_type is tuple:
+			out.append(_LIST if item_type is list else _TUPLE)
+			_write_varint(out, len(item))
+			push(reversed(item))
+		elif item_type is dict:
+			out.append(_DICT)
+			_write_varint(out, len(item))
+			for key, value in reversed(item.items()):
+				stack.append(value)
+				stack.append(key)
+		elif item_type in _operation_ids:
+			index = nodes.get(id(item))
+			if index is None:
+				nodes[id(item)] = len(nodes)
+				out.append(_OPERATION)
+				_write_varint(out, _operation_ids[item_type])
+				push(getattr(item, slot) for slot in reversed(item_type.__slots__))
+			else:
+				out.append(_OPERATION_REF)
+				_write_varint(out, index)
+		elif item_type is operations.ConstRef:  # decoded as the str it refers to
+			stack.append(str(item))
+		elif item_type is Instruction:
+			out.append(_INSTRUCTION)
+			push(reversed(item._fields()))
+		elif item_type is InstructionTable:
+			out.append(_TABLE)
+			_write_table(out, item)
+			stack.append(item.argvals)
+		else:
+			raise TypeError(f"can't encode {item_type.__name__} in the IR")
+	return bytes(out)
+
+def loads(data):
+	""" decodes what dumps encoded. Raises ValueError for anything else, including truncated or damaged IR"""
+	data = memoryview(data)
+	if bytes(data[:len(MAGIC)]) != MAGIC:
+		raise ValueError("not dis2py IR")
+	try:
+		version, pos = _read_varint(data, len(MAGIC))
+		if version != IR_VERSION:
+			raise ValueError(f"unsupported IR version {version}, expected {IR_VERSION}")
+		return _decode(data, pos)
+	# reading past the end, a reference to something that isn't there, or values that don't fit where they are
+	except (IndexError, TypeError):
+		raise ValueError("bad dis2py IR: truncated or damaged") from None
+
+def _decode(data, pos):
+	strings = []
+	nodes = []
+	# containers being decoded: [tag, number of values still expected, values, object being built]
+	stack = []
+	while True:
+		tag = data[pos]
+		pos += 1
+		if tag == _NONE:
+			value = None
+		elif tag == _STR:
+			length, pos = _read_varint(data, pos)
+			value, pos = _read_bytes(data, pos, length)
+			value = str(value, "utf-8")
+			strings.append(value)
+		elif tag == _STR_REF:
+			index, pos = _read_varint(data, pos)
+			value = strings[index]
+		elif tag == _TRUE or tag == _FALSE:
+			value = tag == _TRUE
+		elif tag == _INT:
+			value, pos = _read_varint(data, pos)
+		elif tag == _NEG_INT:
+			value, pos = _read_varint(data, pos)
+			value = -value
+		elif tag == _LIST or tag == _TUPLE or tag == _DICT:
+			count, pos = _read_varint(data, pos)
+			if tag == _DICT:
+				count *= 2
+			if count:
+				stack.append([tag, count, [], None])
+				continue
+			value = {} if tag == _DICT else [] if tag == _LIST else ()
+		elif tag == _OPERATION:
+			type_id, pos = _read_varint(data, pos)
+			cls = OPERATION_TYPES[type_id]
+			value = cls.__new__(cls)
+			nodes.append(value)
+			if cls.__slots__:
+				stack.append([tag, len(cls.__slots__), [], value])
+				continue
+		elif tag == _OPERATION_REF:
+			index, pos = _read_varint(data, pos)
+			value = nodes[index]
+		elif tag == _INSTRUCTION:
+			stack.append([tag, 5, [], None])
+			continue
+		elif tag == _TABLE or tag == _INSTRUCTION_LIST:
+			table, pos = _read_table(data, pos)
+			stack.append([tag, 1, [], table])
+			continue
+		else:
+			raise ValueError(f"unknown tag {tag} at {pos - 1}")
+		# hand the value to the container it's in, finishing every container that's now complete
+		while stack:
+			frame = stack[-1]
+			values = frame[2]
+			values.append(value)
+			if len(values) < frame[1]:
+				break
+			stack.pop()
+			frame_tag = frame[0]
+			if frame_tag == _LIST:
+				value = values
+			elif frame_tag == _TUPLE:
+				value = tuple(values)
+			elif frame_tag == _DICT:
+				value = dict(zip(values[::2], values[1::2]))
+			elif frame_tag == _OPERATION:
+				value = frame[3]
+				for slot, slot_value in zip(type(value).__slots__, values):
+					setattr(value, slot, slot_value)
+			elif frame_tag == _INSTRUCTION:
+				value = Instruction(*values)
+			else:  # _TABLE or _INSTRUCTION_LIST
+				value = frame[3]
+				value.argvals = values[0]
+				if frame_tag == _INSTRUCTION_LIST:
+					value = list(value)
+		else:
+			if pos != len(data):
+				raise ValueError("trailing data after the IR")
+			return value
+
+def dump(obj, fp):
+	fp.write(dumps(obj))
+
+def load(fp):
+	return loads(fp.read())
@@ -1,157 +1,298 @@
 from abc import abstractmethod, ABC
+from functools import lru_cache, partial
 
 class Operation(ABC):
+	__slots__ = ()
+	
 	@abstractmethod
+	def parts(self):
+		""" returns the pieces of code this operation renders to, in order: strings are written as is,
+		operations are rendered in turn and anything else is converted with str()"""
+	
+	def __str__(self):
+		return to_code(self)
+
+class _End:
+	# marks where the code of an operation ends in CodeEmitter.buffer
+	__slots__ = ("key", "start")
+	
+	def __init__(self, key, start):
+		self.key = key
+		self.start = start
+
+class ConstRef:
+	""" a large argval (eg. a bytes literal megabytes long), kept as where it is in the disassembly it came from
+	rather than copied out of it. It's copied out by str(), once it's rendered"""
+	__slots__ = ("source", "start", "end")
+	
+	def __init__(self, source, start, end):
+		self.source = source
+		self.start = start
+		self.end = end
+	
 	def __str__(self):
-		pass
+		return self.source[self.start:self.end]
+	
+	def __len__(self):
+		return self.end - self.start
+	
+	def __repr__(self):
+		return f"ConstRef({self.start}, {self.end})"
+	
+	def __eq__(self, other):
+		if isinstance(other, (ConstRef, str)):
+			return str(self) == str(other)
+		return NotImplemented
+	
+	def __hash__(self):
+		return hash(str(self))
+
+class CodeEmitter:
+	""" renders trees of operations into a single buffer, walking them with an explicit stack
+	instead of recursing. An operation that occurs more than once is only rendered once"""
+	def __init__(self):
+		self.buffer = []
+		self._spans = {}  # id(operation) -> (start, end) of its code in buffer
+		self._memo = {}  # id(operation) -> its code, for operations seen twice
+		self.large = False  # whether a ConstRef has been rendered since this was last reset
+	
+	def emit(self, *parts):
+		buffer = self.buffer
+		append = buffer.append
+		spans = self._spans
+		stack = list(reversed(parts))
+		pop = stack.pop
+		push = stack.append
+		while stack:
+			item = pop()
+			if type(item) is str:
+				append(item)
+			elif type(item) is _End:
+				spans[item.key] = (item.start, len(buffer))
+			elif isinstance(item, Operation):
+				key = id(item)
+				span = spans.get(key)
+				if span is None:
+					push(_End(key, len(buffer)))
+					stack.extend(reversed(item.parts()))
+				else:
+					code = self._memo.get(key)
+					if code is None:
+						code = self._memo[key] = "".join(buffer[span[0]:span[1]])
+					append(code)
+			else:
+				if type(item) is ConstRef:
+					self.large = True
+				append(str(item))
+	
+	def getvalue(self):
+		return "".join(self.buffer)
+
+def to_code(*parts):
+	emitter = CodeEmitter()
+	emitter.emit(*parts)
+	return emitter.getvalue()
+
+def _join(items, sep=","):
+	parts = []
+	for item in items:
+		parts.append(item)
+		parts.append(sep)
+	if parts:
+		parts.pop()
+	return parts
 
 class Invalid(Operation):
+	__slots__ = ("opname", "arg", "argval")
+	
 	def __init__(self, opname, arg, argval):
 		self.opname = opname
 		self.arg = arg
 		self.argval = argval
 	
-	def __str__(self):
-		return f"<{self.opname}({self.arg},{self.argval})>"
+	def parts(self):
+		return ["<", self.opname, "(", self.arg, ",", self.argval, ")>"]
 
 class Value(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return self.val
+	def parts(self):
+		return [self.val]
 
 class Assign(Operation):
+	__slots__ = ("left", "right")
+	
 	def __init__(self, left, right):
 		self.left = left
 		self.right = right
 	
-	def __str__(self):
-		return f"{self.left}={self.right}"
+	def parts(self):
+		return [self.left, "=", self.right]
 
 class SubscriptAssign(Operation):
+	__slots__ = ("subscript", "left", "right")
+	
 	def __init__(self, subscript, left, right):
 		self.subscript = subscript
 		self.left = left
 		self.right = right
 	
-	def __str__(self):
-		return f"{self.left}[{self.subscript}]={self.right}"
+	def parts(self):
+		return [self.left, "[", self.subscript, "]=", self.right]
 
 class Return(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"return {self.val}"
+	def parts(self):
+		return ["return ", self.val]
 
 class Yield(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"yield {self.val}"
+	def parts(self):
+		return ["yield ", self.val]
 
 class ForLoop(Operation):
+	__slots__ = ("indicies", "iterator")
+	
 	def __init__(self, indicies, iterator):
 		self.indicies = indicies
 		self.iterator = iterator
 	
-	def __str__(self):
-		return f"for {','.join(map(str,self.indicies))} in {self.iterator}:"
+	def parts(self):
+		return ["for ", *_join(self.indicies), " in ", self.iterator, ":"]
 
 class WhileLoop(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"while {self.val}:"
+	def parts(self):
+		return ["while ", self.val, ":"]
 
 class If(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"if {self.val}:"
+	def parts(self):
+		return ["if ", self.val, ":"]
 
 class Elif(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"elif {self.val}:"
+	def parts(self):
+		return ["elif ", self.val, ":"]
 
 class Else(Operation):
-	def __str__(self):
-		return "else:"
+	__slots__ = ()
+	
+	def parts(self):
+		return ["else:"]
 
 class Break(Operation):
-	def __str__(self):
-		return "break"
+	__slots__ = ()
+	
+	def parts(self):
+		return ["break"]
 
 class Continue(Operation):
-	def __str__(self):
-		return "continue"
+	__slots__ = ()
+	
+	def parts(self):
+		return ["continue"]
 
 class Import(Operation):
+	__slots__ = ("module", "alias")
+	
 	def __init__(self, module, alias=None):
 		self.module = module
 		self.alias = alias
 	
-	def __str__(self):
-		alias_str = "" if self.alias is None else f" as {self.alias}"
-		return f"import {self.module}{alias_str}"
+	def parts(self):
+		alias_parts = [] if self.alias is None else [" as ", self.alias]
+		return ["import ", self.module, *alias_parts]
 
 class FromImport(Operation):
+	__slots__ = ("module", "vals")
+	
 	def __init__(self, module, vals):
 		self.module = module
 		self.vals = vals
 	
-	def __str__(self):
-		return f"from {self.module} import {','.join(map(str,self.vals))}"
+	def parts(self):
+		return ["from ", self.module, " import ", *_join(self.vals)]
 
 class Raise(Operation):
+	__slots__ = ("exception", "cause")
+	
 	def __init__(self, exception=None, cause=None):
 		self.exception = exception
 		self.cause = cause
 	
-	def __str__(self):
-		exception_str = "" if self.exception is None else f" {self.exception}"
-		cause_str = "" if self.cause is None else f" from {self.cause}"
-		return f"raise{exception_str}{cause_str}"
+	def parts(self):
+		exception_parts = [] if self.exception is None else [" ", self.exception]
+		cause_parts = [] if self.cause is None else [" from ", self.cause]
+		return ["raise", *exception_parts, *cause_parts]
 
 class Jump(Operation):
 	# for raw jumps flag
+	__slots__ = ("target", "condition")
+	
 	def __init__(self, target, condition=None):
 		self.target = target
 		self.condition = condition
 	
-	def __str__(self):
-		cond_str = f" if {self.condition}" if self.condition is not None else ""
-		return f"jump {self.target}{cond_str}"
+	def parts(self):
+		cond_parts = [" if ", self.condition] if self.condition is not None else []
+		return ["jump ", self.target, *cond_parts]
 
 _build_operators = {"list": "[]", "tuple": "()", "set": "{}"}
 
-def build_operation(operation):
-	operator = _build_operators[operation.lower()]
+class BuildOperation(Operation):
+	__slots__ = ("operator", "args")
 	
-	class BuildOperation(Operation):
-		def __init__(self, args):
-			self.args = args
-		
-		def __str__(self):
-			return operator[0] + ",".join(map(str, self.args)) + operator[1]
+	def __init__(self, operator, args):
+		self.operator = operator
+		self.args = args
 	
-	return BuildOperation
+	def parts(self):
+		return [self.operator[0], *_join(self.args), self.operator[1]]
+
+@lru_cache(maxsize=None)
+def build_operation(operation):
+	return partial(BuildOperation, _build_operators[operation.lower()])
 
 class BuildMap(Operation):
+	__slots__ = ("args",)
+	
 	def __init__(self, args):
 		self.args = args
 	
-	def __str__(self):
-		return "{" + "".join(f"{k}:{v}" for v, k in zip(self.args[::2], self.args[1::2])) + "}"
+	def parts(self):
+		parts = ["{"]
+		for v, k in zip(self.args[::2], self.args[1::2]):
+			parts += [k, ":", v]
+		parts.append("}")
+		return parts
 
 class FunctionCall(Operation):
+	__slots__ = ("func", "args", "kwargs")
+	
 	def __init__(self, func, args, kwargs=None):
 		self.func = func
 		self.args = args
@@ -160,95 +301,117 @@ class FunctionCall(Operation):
 		else:
 			self.kwargs = kwargs
 	
-	def __str__(self):
-		kwargs = [f"{k}={v}" for k, v in self.kwargs.items()]
-		return f"{self.func}({','.join(map(str,self.args+kwargs))})"
+	def parts(self):
+		parts = [self.func, "("]
+		for arg in self.args:
+			parts += [arg, ","]
+		for k, v in self.kwargs.items():
+			parts += [k, "=", v, ","]
+		if self.args or self.kwargs:
+			parts.pop()  # trailing comma
+		parts.append(")")
+		return parts
 
 class Closure(Operation):
+	__slots__ = ("func", "closure_vars")
+	
 	def __init__(self, func, closure_vars):
 		self.func = func
 		self.closure_vars = closure_vars
 	
-	def __str__(self):
-		arg_str = ','.join(map(str, self.closure_vars))
-		return f"(lambda {arg_str},*args,**kwargs:{self.func}({arg_str},*args,**kwargs))"
+	def parts(self):
+		arg_parts = _join(self.closure_vars)
+		return ["(lambda ", *arg_parts, ",*args,**kwargs:", self.func, "(", *arg_parts, ",*args,**kwargs))"]
 
 class Attribute(Operation):
+	__slots__ = ("prop", "obj")
+	
 	def __init__(self, obj, prop):
 		self.prop = prop
 		self.obj = obj
 	
-	def __str__(self):
-		return f"{self.obj}.{self.prop}"
+	def parts(self):
+		return [self.obj, ".", self.prop]
 
 class Iter(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"iter({self.val})"
+	def parts(self):
+		return ["iter(", self.val, ")"]
 
 class UnpackSeq(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"*{self.val}"
+	def parts(self):
+		return ["*", self.val]
 
 class UnpackDict(Operation):
+	__slots__ = ("val",)
+	
 	def __init__(self, val):
 		self.val = val
 	
-	def __str__(self):
-		return f"**{self.val}"
+	def parts(self):
+		return ["**", self.val]
 
 class Slice(Operation):
+	__slots__ = ("start", "stop", "step")
+	
 	def __init__(self, start, stop, step=None):
 		self.start = start
 		self.stop = stop
 		self.step = step
 	
-	def __str__(self):
-		step_str = f",{self.step}" if self.step is not None else ""
-		return f"slice({self.start},{self.stop}{step_str})"
+	def parts(self):
+		step_parts = [",", self.step] if self.step is not None else []
+		return ["slice(", self.start, ",", self.stop, *step_parts, ")"]
 
 class SubscriptSlice(Operation):
+	__slots__ = ("val", "start", "stop", "step")
+	
 	def __init__(self, val, start, stop, step=None):
 		self.val = val
 		self.start = start
 		self.stop = stop
 		self.step = step
 	
-	def __str__(self):
-		start_str = self.start if self.start is not None else ""
-		stop_str = self.stop if self.stop is not None else ""
-		step_str = f":{self.step}" if self.step is not None else ""
-		return f"{self.val}[{start_str}:{stop_str}{step_str}]"
+	def parts(self):
+		start = self.start if self.start is not None else ""
+		stop = self.stop if self.stop is not None else ""
+		step_parts = [":", self.step] if self.step is not None else []
+		return [self.val, "[", start, ":", stop, *step_parts, "]"]
 
 class Subscript(Operation):
+	__slots__ = ("subscript", "val")
+	
 	def __init__(self, val, subscript):
 		self.subscript = subscript
 		self.val = val
 	
-	def __str__(self):
-		return f"{self.val}[{self.subscript}]"
+	def parts(self):
+		return [self.val, "[", self.subscript, "]"]
 
-def binary_op_to_str(left, right, operator):
-	if isinstance(
-		left, (Value, Subscript, SubscriptSlice, Attribute, FunctionCall)
-	):  #drop the parens
-		left_str = str(left)
-	else:
-		left_str = f"({left})"
-	if isinstance(
-		right, (Value, Subscript, SubscriptSlice, Attribute, FunctionCall)
-	):  #drop the parens
-		right_str = str(right)
+def operand_parts(val):
+	if isinstance(val, (Value, Subscript, SubscriptSlice, Attribute, FunctionCall)):  #drop the parens
+		return [val]
 	else:
-		right_str = f"({right})"
-	return left_str + operator + right_str
+		return ["(", val, ")"]
+
+def binary_op_parts(left, right, operator):
+	return [*operand_parts(left), operator, *operand_parts(right)]
+
+def binary_op_to_str(left, right, operator):
+	return to_code(*binary_op_parts(left, right, operator))
 
 class Comparison(Operation):
+	__slots__ = ("operator", "left", "right")
+	
 	def __init__(self, operator, left, right):
 		if operator in ("not in", "in"):
 			self.operator = f" {operator} "
@@ -257,28 +420,24 @@ class Comparison(Operation):
 		self.left = left
 		self.right = right
 	
-	def __str__(self):
-		return binary_op_to_str(self.left, self.right, self.operator)
+	def parts(self):
+		return binary_op_parts(self.left, self.right, self.operator)
 
 _unary_operators = {"positive": "+", "negative": "-", "not": "not", "invert": "~"}
 
-def unary_operation(operation: str):
-	operator = _unary_operators[operation.lower()]
-	
-	class UnaryOperation(Operation):
-		def __init__(self, val):
-			self.val = val
-		
-		def __str__(self):
-			if isinstance(
-				self.val, (Value, Subscript, SubscriptSlice, Attribute, FunctionCall)
-			):  #drop the parens
-				val_str = str(self.val)
-			else:
-				val_str = f"({self.val})"
-			return operator + val_str
+class UnaryOperation(Operation):
+	__slots__ = ("operator", "val")
 	
-	return UnaryOperation
+	def __init__(self, operator, val):
+		self.operator = operator
+		self.val = val
+	
+	def parts(self):
+		return [self.operator, *operand_parts(self.val)]
+
+@lru_cache(maxsize=None)
+def unary_operation(operation: str):
+	return partial(UnaryOperation, _unary_operators[operation.lower()])
 
 _binary_operators = {
 	"power": "**",
@@ -296,28 +455,34 @@ _binary_operators = {
 	"or": "|"
 }
 
-def binary_operation(operation: str):
-	operator = _binary_operators[operation.lower()]
+class BinaryOperation(Operation):
+	__slots__ = ("operator", "left", "right")
 	
-	class BinaryOperation(Operation):
-		def __init__(self, left, right):
-			self.left = left
-			self.right = right
-		
-		def __str__(self):
-			return binary_op_to_str(self.left, self.right, operator)
+	def __init__(self, operator, left, right):
+		self.operator = operator
+		self.left = left
+		self.right = right
 	
-	return BinaryOperation
+	def parts(self):
+		return binary_op_parts(self.left, self.right, self.operator)
 
-def inplace_operation(operation: str):
-	operator = _binary_operators[operation.lower()]
+class InplaceOperation(Operation):
+	__slots__ = ("operator", "left", "right")
 	
-	class InplaceOperation(Operation):
-		def __init__(self, left, right):
-			self.left = left
-			self.right = right
-		
-		def __str__(self):
-			return f"{self.left}{operator}={self.right}"
+	def __init__(self, operator, left, right):
+		self.operator = operator
+		self.left = left
+		self.right = right
 	
-	return InplaceOperation
\ No newline at end of file
+	def parts(self):
+		return [self.left, self.operator, "=", self.right]
+
+# the factories below return a constructor for the given operation, shared between calls
+
+@lru_cache(maxsize=None)
+def binary_operation(operation: str):
+	return partial(BinaryOperation, _binary_operators[operation.lower()])
+
+@lru_cache(maxsize=None)
+def inplace_operation(operation: str):
+	return partial(InplaceOperation, _binary_operators[operation.lower()])
\ No newline at end of file
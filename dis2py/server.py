@@ -0,0 +1,137 @@
+""" a long running server that decompiles listings sent over a unix socket or localhost tcp, so
+clients don't pay for starting python for every listing.
+
+The protocol is JSON lines. Each request is one line: {"id": ..., "disasm": "...", "flags": 0, "tab_char": "\t"},
+of which only disasm is required. The response is a line for each function as soon as it's decompiled,
+{"id": ..., "name": ..., "args": [...], "code": ...}, followed by {"id": ..., "done": true, "functions": count}.
+A request that fails gets {"id": ..., "error": "..."} instead. Requests on one connection are answered in order"""
+import asyncio
+import json
+import os
+import signal
+import stat
+import sys
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from .dis2py import BATCH_SIZE, _batches, _decompile_batch, split_funcs, strip_comments
+
+MAX_REQUEST_SIZE = 64 * 1024 * 1024
+
+class DecompileServer:
+	""" handles connections, sending the functions of each request to executor in batches"""
+	def __init__(self, executor, num_workers, max_request_size=MAX_REQUEST_SIZE):
+		self.executor = executor
+		self.num_workers = num_workers
+		self.max_request_size = max_request_size
+		# batches queued on the executor, across every connection. When they're all taken, requests stop
+		# reading more of their listing (and connections stop reading requests) until a batch finishes
+		self.slots = asyncio.Semaphore(2 * num_workers)
+	
+	async def handle_connection(self, reader, writer):
+		try:
+			while True:
+				try:
+					line = await reader.readline()
+				except ValueError:  # no newline within the reader's limit
+					await self._send(writer, {"error": f"request larger than {self.max_request_size} bytes"})
+					break
+				if not line:
+					break
+				await self.handle_request(line, writer)
+		except ConnectionError:
+			pass
+		finally:
+			writer.close()
+			try:
+				await writer.wait_closed()
+			except ConnectionError:
+				pass
+	
+	async def handle_request(self, line, writer):
+		# decoding and splitting a request takes as long as its listing is big, so that's done on the loop's
+		# default (thread) executor, to keep answering the other connections meanwhile
+		loop = asyncio.get_running_loop()
+		request_id = None
+		try:
+			request = await loop.run_in_executor(None, json.loads, line)
+			request_id = request.get("id")
+			disasm = await loop.run_in_executor(None, strip_comments, request["disasm"])
+			flags = int(request.get("flags", 0))
+			tab_char = str(request.get("tab_char", "\t"))
+		except (ValueError, KeyError, TypeError, AttributeError) as e:
+			await self._send(writer, {"id": request_id, "error": f"bad request: {type(e).__name__}: {e}"})
+			return
+		# small listings are still spread over every worker
+		batch_size = min(BATCH_SIZE, len(disasm) // (4 * self.num_workers) + 1)
+		batches = _batches(split_funcs(disasm), batch_size)
+		pending = deque()  # (batch, future), in order
+		count = 0
+		try:
+			while True:
+				batch = await loop.run_in_executor(None, next, batches, None)
+				if batch is None:
+					break
+				await self.slots.acquire()
+				future = loop.run_in_executor(self.executor, _decompile_batch, batch, flags, tab_char)
+				future.add_done_callback(lambda _: self.slots.release())
+				pending.append((batch, future))
+				while pending and pending[0][1].done():  # send what's ready before queueing more
+					count += await self._send_batch(writer, request_id, *pending.popleft())
+			while pending:
+				count += await self._send_batch(writer, request_id, *pending.popleft())
+		except ConnectionError:
+			raise
+		except Exception as e:  # pylint: disable=broad-except
+			for _, future in pending:
+				future.cancel()
+			await self._send(writer, {"id": request_id, "error": f"{type(e).__name__}: {e}"})
+			return
+		await self._send(writer, {"id": request_id, "done": True, "functions": count})
+	
+	async def _send_batch(self, writer, request_id, batch, future):
+		results, _ = await future
+		for (name, _), (code, arg_names) in zip(batch, results):
+			writer.write(self._encode({"id": request_id, "name": name, "args": arg_names, "code": code}))
+		await writer.drain()  # waits while the client isn't keeping up
+		return len(batch)
+	
+	async def _send(self, writer, response):
+		writer.write(self._encode(response))
+		await writer.drain()
+	
+	@staticmethod
+	def _encode(response):
+		return json.dumps(response).encode() + b"\n"
+
+def _remove_stale_socket(path):
+	try:
+		if stat.S_ISSOCK(os.stat(path).st_mode):
+			os.unlink(path)
+	except FileNotFoundError:
+		pass
+
+async def serve(socket_path=None, host="127.0.0.1", port=None, workers=None, max_request_size=MAX_REQUEST_SIZE):
+	""" serves on the unix socket at socket_path, or on host:port, until cancelled"""
+	workers = workers or os.cpu_count() or 1
+	with ProcessPoolExecutor(workers) as executor:
+		server = DecompileServer(executor, workers, max_request_size)
+		# the limit is one more than the largest request, so that readline can see its newline
+		if socket_path is not None:
+			_remove_stale_socket(socket_path)
+			listener = await asyncio.start_unix_server(server.handle_connection, socket_path, limit=max_request_size + 1)
+			address = socket_path
+		else:
+			listener = await asyncio.start_server(server.handle_connection, host, port, limit=max_request_size + 1)
+			address = f"{host}:{listener.sockets[0].getsockname()[1]}"
+		try:  # stop like on ctrl+c when terminated
+			asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, asyncio.current_task().cancel)
+		except NotImplementedError:  # windows
+			pass
+		print(f"listening on {address} with {workers} workers", file=sys.stderr)
+		try:
+			async with listener:
+				await listener.serve_forever()
+		finally:
+			if socket_path is not None:
+				_remove_stale_socket(socket_path)
@@ -0,0 +1,44 @@
+from .cache import content_key
+from .dis2py import _decompile_funcs, format_function, get_flags, split_funcs, strip_comments
+
+class DecompileSession:
+	""" remembers the functions decompiled from the last listing, so that decompiling an edited
+	version of it only redoes the functions whose disassembly changed"""
+	def __init__(self, flags=0, tab_char="\t", workers=None):
+		self.flags = flags
+		self.tab_char = tab_char
+		self.workers = workers
+		self.digests = {}  # function name -> content_key of its disassembly in the last listing
+		self.results = {}  # content_key -> (code, arg_names)
+		self.changed = []  # names of the functions that were added or changed by the last update
+		self.removed = []  # names of the functions that were removed by the last update
+	
+	def update(self, disasm):
+		""" decompiles disasm, reusing the previous results of every function whose disassembly
+		is the same as in the last listing. Returns a list of (name, code, arg_names)"""
+		funcs = []  # (name, disasm, digest)
+		for name, func in split_funcs(strip_comments(disasm)):
+			funcs.append((name, func, content_key(func, get_flags(name) | self.flags, self.tab_char)))
+		# functions are matched by content rather than only by name, so that comprehensions whose
+		# code object moved to a different address are still reused
+		misses = {}
+		for name, func, digest in funcs:
+			if digest not in self.results and digest not in misses:
+				misses[digest] = (name, func)
+		decompiled = _decompile_funcs(misses.values(), self.flags, self.tab_char, self.workers)
+		for digest, (name, *result) in zip(misses, list(decompiled)):
+			self.results[digest] = tuple(result)
+		
+		digests = {name: digest for name, _, digest in funcs}
+		self.changed = [name for name, digest in digests.items() if self.digests.get(name) != digest]
+		self.removed = [name for name in self.digests if name not in digests]
+		self.digests = digests
+		live = set(digests.values())
+		self.results = {digest: result for digest, result in self.results.items() if digest in live}
+		return [(name, *self.results[digest]) for name, _, digest in funcs]
+	
+	def pretty_decompile(self, disasm):
+		""" like pretty_decompile, but only redoing the functions that changed since the last call"""
+		return "\n".join(
+			format_function(name, code, arg_names, self.tab_char) for name, code, arg_names in self.update(disasm)
+		)
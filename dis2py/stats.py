@@ -0,0 +1,70 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from time import perf_counter
+
+class DecompileStats:
+	""" opt-in instrumentation, passed as stats= to decompile_all and friends. Records the wall time
+	spent in each stage and each function, how often each opcode handler ran and for how long,
+	and how many Invalid nodes were emitted"""
+	def __init__(self):
+		self.stages = defaultdict(float)  # {stage: seconds}
+		self.functions = defaultdict(float)  # {function name: seconds}
+		self.opcode_counts = defaultdict(int)  # {opname: number of times its handler ran}
+		self.opcode_times = defaultdict(float)  # {opname: seconds spent in its handler}
+		self.invalid = 0
+	
+	@contextmanager
+	def stage(self, name):
+		start = perf_counter()
+		try:
+			yield
+		finally:
+			self.stages[name] += perf_counter() - start
+	
+	@contextmanager
+	def function(self, name):
+		start = perf_counter()
+		try:
+			yield
+		finally:
+			self.functions[name] += perf_counter() - start
+	
+	def timed(self, stage, iterable):
+		""" yields from iterable, adding the time spent producing each item to stage"""
+		iterator = iter(iterable)
+		while True:
+			start = perf_counter()
+			try:
+				item = next(iterator)
+			except StopIteration:
+				self.stages[stage] += perf_counter() - start
+				return
+			self.stages[stage] += perf_counter() - start
+			yield item
+	
+	def add_opcode(self, opname, seconds):
+		self.opcode_counts[opname] += 1
+		self.opcode_times[opname] += seconds
+	
+	def merge(self, other):
+		""" adds the numbers recorded by other (eg. in a worker process) to these"""
+		for mine, theirs in (
+			(self.stages, other.stages), (self.functions, other.functions),
+			(self.opcode_counts, other.opcode_counts), (self.opcode_times, other.opcode_times)
+		):
+			for key, value in theirs.items():
+				mine[key] += value
+		self.invalid += other.invalid
+	
+	def report(self, top=10):
+		""" returns a human readable summary, with the top slowest functions and opcode handlers"""
+		lines = [f"{'stage':<24}{'seconds':>12}"]
+		for name, seconds in self.stages.items():
+			lines.append(f"{name:<24}{seconds:12.4f}")
+		lines.append(f"{len(self.functions)} functions, {self.invalid} invalid nodes")
+		for name, seconds in sorted(self.functions.items(), key=lambda item: -item[1])[:top]:
+			lines.append(f"  {name:<40}{seconds:12.4f}s")
+		lines.append(f"{'opname':<24}{'count':>12}{'seconds':>12}")
+		for opname, seconds in sorted(self.opcode_times.items(), key=lambda item: -item[1])[:top]:
+			lines.append(f"{opname:<24}{self.opcode_counts[opname]:12}{seconds:12.4f}")
+		return "\n".join(lines)
@@ -0,0 +1,51 @@
+""" the control flow analysis of a function's instructions"""
+from dis2py import dis_to_instructions
+from dis2py.analysis import FlowGraph
+from dis2py.dis2py import dis_to_instruction_table
+
+# for x in a:
+#     while x:
+#         if x > 5:
+#             break
+#         x -= 1
+# return a
+NESTED_LOOPS = """
+  4           0 LOAD_FAST                0 (a)
+              2 GET_ITER
+        >>    4 FOR_ITER                28 (to 34)
+              6 STORE_FAST               1 (x)
+
+  5     >>    8 LOAD_FAST                1 (x)
+             10 POP_JUMP_IF_FALSE        4
+
+  6          12 LOAD_FAST                1 (x)
+             14 LOAD_CONST               1 (5)
+             16 COMPARE_OP               4 (>)
+             18 POP_JUMP_IF_FALSE       22
+
+  7          20 JUMP_ABSOLUTE            4
+
+  8     >>   22 LOAD_FAST                1 (x)
+             24 LOAD_CONST               2 (1)
+             26 INPLACE_SUBTRACT
+             28 STORE_FAST               1 (x)
+             30 JUMP_ABSOLUTE            8
+             32 JUMP_ABSOLUTE            4
+
+  9     >>   34 LOAD_FAST                0 (a)
+             36 RETURN_VALUE
+"""
+
+def test_nested_loops():
+	for instructions in (dis_to_instructions(NESTED_LOOPS), dis_to_instruction_table(NESTED_LOOPS)):
+		flow = FlowGraph(instructions)
+		assert flow.index_at(22) == 11 and flow.index_at(23) is None
+		# the indices of the FOR_ITER, the POP_JUMPs and the JUMP_ABSOLUTEs
+		assert flow.jump_sources == {34: [2], 4: [5, 10, 16], 22: [9], 8: [15]}
+		assert flow.first_jump_absolute == {4: 10, 8: 15}
+		assert flow.is_loop_exit(34) and flow.is_loop_exit(22) and not flow.is_loop_exit(8)
+		blocks = [(block.start, block.end, block.is_loop_header) for block in flow.blocks]
+		assert blocks == [
+			(0, 2, False), (2, 3, True), (3, 4, False), (4, 6, True), (6, 10, False), (10, 11, False), (11, 16, False),
+			(16, 17, False), (17, 19, False)
+		]
@@ -0,0 +1,17 @@
+""" the names the package exports"""
+import dis2py
+import dis2py.dis2py
+
+def test_star_import_gives_the_decompiler_module():
+	# `from dis2py import *` used to re-export every public name of dis2py.dis2py
+	namespace = {}
+	exec("from dis2py import *", namespace)
+	for name in dir(dis2py.dis2py):
+		value = getattr(dis2py.dis2py, name)
+		if not name.startswith("_") and getattr(value, "__module__", None) == "dis2py.dis2py":
+			assert namespace[name] is value, name
+	assert namespace["operations"] is dis2py.operations
+
+def test_all_names_resolve():
+	for name in dis2py.__all__:
+		assert getattr(dis2py, name) is not None
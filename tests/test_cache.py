@@ -0,0 +1,29 @@
+""" the on-disk cache's size accounting and eviction"""
+from dis2py.cache import DecompileCache
+
+def disk_size(cache):
+	return sum(path.stat().st_size for path in cache._entries())
+
+def test_replacing_an_entry_is_counted_once(tmp_path):
+	cache = DecompileCache(tmp_path)
+	for _ in range(5):
+		cache.put("x", 0, "\t", ("code", ["a"]))
+	assert cache.size == disk_size(cache)
+
+def test_eviction_goes_below_max_size(tmp_path):
+	cache = DecompileCache(tmp_path, max_size=10000)
+	evictions = 0
+	evict = cache.evict
+	
+	def counting_evict():
+		nonlocal evictions
+		evictions += 1
+		evict()
+	
+	cache.evict = counting_evict
+	for i in range(1000):
+		cache.put(f"func {i}", 0, "\t", ("code" * 10, ["a"]))
+	assert cache.size == disk_size(cache) <= cache.max_size
+	# each eviction frees room for many more entries, rather than for just the next one
+	assert evictions < 1000 / 10
+	assert cache.get("func 999", 0, "\t") == ("code" * 10, ["a"])
@@ -0,0 +1,37 @@
+""" the command line's handling of its inputs"""
+import sys
+from pathlib import Path
+
+import pytest
+
+from dis2py.__main__ import expand_inputs, main
+from dis2py.index import index_path
+
+def test_saved_indexes_are_not_inputs(tmp_path):
+	listing = tmp_path / "disas.txt"
+	listing.write_text("  1           0 LOAD_CONST               0 (None)\n              2 RETURN_VALUE\n")
+	index_path(listing).write_text("{}")
+	assert [path for path, _ in expand_inputs([str(tmp_path)])] == [str(listing)]
+	assert [path for path, _ in expand_inputs([str(tmp_path / "*")])] == [str(listing)]
+
+def test_glob_output_names_keep_directories(tmp_path):
+	for directory in ("a", "b"):
+		(tmp_path / directory).mkdir()
+		(tmp_path / directory / "x.txt").write_text("")
+	output_names = [output_name for _, output_name in expand_inputs([str(tmp_path / "**" / "*.txt")])]
+	assert output_names == [Path("a/x.txt"), Path("b/x.txt")]
+
+def test_only_missing_functions_are_reported_as_missing(tmp_path, monkeypatch, capsys):
+	listing = tmp_path / "disas.txt"
+	# the decompiler has no BUILD_STRING operation, and fails on it with a KeyError of its own
+	listing.write_text(
+		"Disassembly of f:\n  2           0 LOAD_FAST                0 (a)\n              2 FORMAT_VALUE             0\n"
+		"              4 BUILD_STRING             1\n              6 RETURN_VALUE\n"
+	)
+	monkeypatch.setattr(sys, "argv", ["dis2py", str(listing), "--function", "g"])
+	with pytest.raises(SystemExit):
+		main()
+	assert "no function 'g'" in capsys.readouterr().err
+	monkeypatch.setattr(sys, "argv", ["dis2py", str(listing), "--function", "f"])
+	with pytest.raises(KeyError):
+		main()
@@ -0,0 +1,32 @@
+""" decompiling code objects of the running interpreter. Apart from the refusal, these only run on python 3.8"""
+import sys
+
+import pytest
+
+from dis2py import BYTECODE_VERSION, UnsupportedBytecodeError, decompile_code
+
+def sample(a, b=1):
+	return a + b
+
+@pytest.mark.skipif(sys.version_info[:2] == BYTECODE_VERSION, reason="needs another python version")
+def test_other_versions_are_refused_up_front():
+	with pytest.raises(UnsupportedBytecodeError, match="decompile_all"):
+		decompile_code(sample)
+
+@pytest.mark.skipif(sys.version_info[:2] != BYTECODE_VERSION, reason="needs the supported python version")
+def test_supported_version_decompiles():
+	(name, code, arg_names), = decompile_code(sample)
+	assert name == "main"
+	assert arg_names == ["a", "b"]
+	assert code == "return a+b"
+
+def outer(x):
+	def inner(y):
+		return x + y
+	return inner
+
+@pytest.mark.skipif(sys.version_info[:2] != BYTECODE_VERSION, reason="needs the supported python version")
+def test_closures_take_their_free_variables_first():
+	functions = {name.split("_0x")[0]: (code, arg_names) for name, code, arg_names in decompile_code(outer)}
+	assert functions["inner"] == ("return x+y", ["x", "y"])
+	assert "(lambda x,*args,**kwargs:inner_0x" in functions["main"][0]
@@ -0,0 +1,35 @@
+""" large constants, which are left in the disassembly as a ConstRef until they're rendered"""
+from pathlib import Path
+
+import pytest
+
+from benchmarks import synthetic
+from dis2py import dis2py
+
+SAMPLES = Path(__file__).resolve().parent.parent / "samples"
+
+@pytest.mark.parametrize(
+	"disasm", [(SAMPLES / "disas.txt").read_text(), synthetic.comprehensions(5), synthetic.big_literals(50)],
+	ids=["disas.txt", "comprehensions", "literals"]
+)
+def test_every_constant_as_a_const_ref(disasm, monkeypatch):
+	expected = dis2py.pretty_decompile(disasm)
+	monkeypatch.setattr(dis2py, "LARGE_CONST_SIZE", 0)
+	assert any(type(instruction.argval) is dis2py.operations.ConstRef for instruction in dis2py.dis_to_instructions(disasm))
+	assert dis2py.pretty_decompile(disasm) == expected
+
+def test_import_and_kwargs_with_const_refs(monkeypatch):
+	disasm = """  1           0 LOAD_CONST               0 (0)
+              2 LOAD_CONST               1 (None)
+              4 IMPORT_NAME              0 (os)
+              6 STORE_NAME               0 (os)
+
+  2           8 LOAD_NAME                1 (f)
+             10 LOAD_CONST               2 (1)
+             12 LOAD_CONST               3 (('k',))
+             14 CALL_FUNCTION_KW         2
+             16 RETURN_VALUE
+"""
+	expected = dis2py.pretty_decompile(disasm)
+	monkeypatch.setattr(dis2py, "LARGE_CONST_SIZE", 0)
+	assert dis2py.pretty_decompile(disasm) == expected
@@ -0,0 +1,19 @@
+""" decompiling identical functions only once (DEDUPE and SHARED_HELPERS)"""
+from benchmarks import synthetic
+from dis2py import DEDUPE, SHARED_HELPERS, decompile_all
+
+def test_dedupe_output_unchanged():
+	disasm = synthetic.many_functions(50) + synthetic.comprehensions(5)
+	assert list(decompile_all(disasm, DEDUPE)) == list(decompile_all(disasm))
+
+def test_shared_helpers_keeps_named_functions():
+	# identical named functions can each be called by name, so none of them may be dropped
+	disasm = synthetic.many_functions(50)
+	assert list(decompile_all(disasm, SHARED_HELPERS)) == list(decompile_all(disasm))
+
+def test_shared_helpers_merges_code_objects():
+	funcs = list(decompile_all(synthetic.comprehensions(3), SHARED_HELPERS))
+	assert [name for name, _, _ in funcs] == ["main", "listcomp_0x7f0000000000"]
+	main_code = funcs[0][1]
+	assert main_code.count("listcomp_0x7f0000000000(") == 3
+	assert "listcomp_0x7f00000000b0" not in main_code
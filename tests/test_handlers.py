@@ -0,0 +1,12 @@
+""" looking up the handler of each opname"""
+from dis2py import HANDLERS, decompile
+
+def test_unknown_opnames_are_not_kept():
+	handlers = dict(HANDLERS)
+	opnames = ["DAMAGED_" + "".join(chr(ord("A") + int(digit)) for digit in str(i)) for i in range(1000)]
+	disasm = "".join(f"  1 {2 * i:>12} {opname}\n" for i, opname in enumerate(opnames))
+	code, _ = decompile(disasm + "  2         2000 LOAD_SOMETHING_NEW       0 (x)\n")
+	assert code.count("<DAMAGED_") == 1000
+	assert code.endswith("\nx")
+	# only the opname with a family of handlers is kept
+	assert HANDLERS.keys() - handlers.keys() == {"LOAD_SOMETHING_NEW"}
@@ -0,0 +1,34 @@
+""" decompiling several inputs on one pool of workers"""
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+
+from dis2py import decompile_all, split_funcs, strip_comments
+from dis2py.dis2py import _decompile_inputs
+
+SAMPLE = strip_comments((Path(__file__).parent.parent / "samples" / "disas.txt").read_text())
+
+def test_inputs_overlap_and_fail_on_their_own():
+	events = []
+	
+	def listing(key, disasm):
+		@contextmanager
+		def opened():
+			events.append(("open", key))
+			if disasm is None:
+				raise OSError("can't read it")
+			yield split_funcs(disasm), len(disasm)
+		return opened
+	
+	disasms = [SAMPLE, None, SAMPLE, "  1           0 IMPORT_NAME 0 (x)\n", SAMPLE]
+	inputs = [(key, listing(key, disasm)) for key, disasm in enumerate(disasms)]
+	with ThreadPoolExecutor(2) as executor:
+		for key, results, error in _decompile_inputs(inputs, 0, "\t", executor):
+			events.append(("done", key))
+			if key in (1, 3):
+				assert results is None and error is not None
+			else:
+				assert error is None and results == list(decompile_all(SAMPLE))
+	assert [key for event, key in events if event == "done"] == list(range(len(disasms)))
+	# the next inputs were sent to the workers before the first one was finished
+	assert events.index(("open", 1)) < events.index(("done", 0))
@@ -0,0 +1,75 @@
+""" the binary encoding of the intermediate representation"""
+from pathlib import Path
+
+import pytest
+
+from dis2py import RAW_JUMPS, asts_to_code, dis_to_instructions, instructions_to_asts, ir, operations, split_funcs
+from dis2py import strip_comments
+from dis2py.dis2py import dis_to_instruction_table
+
+SAMPLE = strip_comments((Path(__file__).parent.parent / "samples" / "disas.txt").read_text())
+FUNCS = [func for _, func in split_funcs(SAMPLE)]
+
+def round_trip(obj):
+	return ir.loads(ir.dumps(obj))
+
+def test_instruction_lists():
+	instructions = [dis_to_instructions(func) for func in FUNCS]
+	assert round_trip(instructions) == instructions
+
+def test_instruction_tables():
+	table = dis_to_instruction_table(SAMPLE)
+	decoded = round_trip(table)
+	assert type(decoded) is type(table)
+	assert list(decoded) == list(table)
+
+@pytest.mark.parametrize("flags", [0, RAW_JUMPS])
+def test_asts(flags):
+	for func in FUNCS:
+		asts, arg_names = instructions_to_asts(dis_to_instructions(func), flags)
+		decoded, decoded_arg_names = round_trip((asts, arg_names))
+		assert decoded_arg_names == arg_names
+		assert [len(entry) for entry in decoded] == [3 if flags & RAW_JUMPS else 2] * len(asts)
+		assert asts_to_code(decoded, flags) == asts_to_code(asts, flags)
+
+def test_shared_nodes_stay_shared():
+	name = operations.Value("x")
+	asts = [(0, operations.Assign(name, operations.BinaryOperation("+", name, name)))]
+	(_, assign), = round_trip(asts)
+	assert assign.left is assign.right.left is assign.right.right
+	assert asts_to_code(round_trip(asts)) == "x=x+x"
+
+def test_deep_chains():
+	value = operations.Value("x")
+	for _ in range(100000):
+		value = operations.BinaryOperation("+", value, operations.Value("1"))
+	decoded = round_trip(value)
+	depth = 0
+	while type(decoded) is operations.BinaryOperation:
+		assert decoded.right.val == "1"
+		decoded = decoded.left
+		depth += 1
+	assert depth == 100000 and decoded.val == "x"
+
+def test_other_versions_are_refused():
+	data = bytearray(ir.dumps([1]))
+	data[len(ir.MAGIC)] = ir.IR_VERSION + 1
+	with pytest.raises(ValueError, match="version"):
+		ir.loads(bytes(data))
+
+def test_bad_data_is_a_value_error():
+	data = ir.dumps([dis_to_instructions(FUNCS[0]), "text", operations.Value("x")])
+	for end in range(len(data)):
+		with pytest.raises(ValueError):
+			ir.loads(data[:end])
+	with pytest.raises(ValueError, match="not dis2py IR"):
+		ir.loads(b"something else")
+	with pytest.raises(ValueError, match="trailing data"):
+		ir.loads(data + b"\0")
+
+def test_instruction_tables_with_wide_opcodes():
+	opnames = ("OP_" + "".join(chr(ord("A") + int(digit)) for digit in str(i)) for i in range(70000))
+	table = dis_to_instruction_table("".join(f"  1 {2 * i:>12} {opname}\n" for i, opname in enumerate(opnames)))
+	decoded = round_trip(table)
+	assert decoded.opcodes.typecode == table.opcodes.typecode != "H"
+	assert list(decoded) == list(table)
@@ -0,0 +1,89 @@
+""" parity of the single pass lexer with the per-line one it replaced"""
+import random
+import re
+from pathlib import Path
+
+import pytest
+
+from benchmarks import synthetic
+from dis2py.dis2py import dis_to_instruction_table, dis_to_instructions
+
+SAMPLES = Path(__file__).resolve().parent.parent / "samples"
+
+def old_dis_to_instructions(disasm):
+	""" dis_to_instructions as it was before the lexer was rewritten, returning tuples of the fields"""
+	line_num = None
+	instructions = []
+	for line in disasm.split("\n"):
+		match = re.search(
+			r"( ?(?P<line_num>\d+)[ >]+)?(?P<offset>\d+) (?P<opname>[A-Z_]+)(?:\s+(?P<arg>\d+)(?: \((?P<argval>.+)\))?)?",
+			line
+		)
+		if match is not None:
+			if match["line_num"]:
+				line_num = int(match["line_num"])
+			offset = int(match["offset"])
+			opname = match["opname"]
+			if match["arg"] is not None:
+				arg = int(match["arg"])
+			else:
+				arg = None
+			if opname == "EXTENDED_ARG":
+				continue
+			argval = match["argval"]
+			instructions.append((line_num, offset, opname, arg, argval))
+	return instructions
+
+def mutate(disasm, seed):
+	""" disasm with some lines damaged: characters dropped, duplicated or replaced, and lines joined or split"""
+	rng = random.Random(seed)
+	lines = disasm.split("\n")
+	for _ in range(len(lines) // 4 + 1):
+		i = rng.randrange(len(lines))
+		line = lines[i]
+		pos = rng.randrange(len(line) + 1)
+		kind = rng.randrange(5)
+		if kind == 0:
+			line = line[:pos] + line[pos + 1:]
+		elif kind == 1:
+			line = line[:pos] + line[pos:pos + 1] * 2 + line[pos + 1:]
+		elif kind == 2:
+			line = line[:pos] + rng.choice(" \t>()0123456789ABZ_x,'") + line[pos + 1:]
+		elif kind == 3 and i + 1 < len(lines):
+			line += " " + lines.pop(i + 1)
+		else:
+			line = line[:pos] + "\n" + line[pos:]
+		lines[i] = line
+	return "\n".join(lines)
+
+def listings():
+	for path in sorted(SAMPLES.glob("*.txt")):
+		yield path.name, path.read_text()
+	yield "straight", synthetic.straight_line(300)
+	yield "expression", synthetic.long_expression(200)
+	yield "nested", synthetic.nested_blocks(20, width=2)
+	yield "comprehensions", synthetic.comprehensions(30)
+	yield "literals", synthetic.big_literals(300)
+	yield "functions", synthetic.many_functions(20)
+	asm = synthetic.Assembler()  # a constant long enough to be kept as a ConstRef
+	asm.line()
+	asm.emit("LOAD_CONST", 0, repr(bytes(range(256)) * 20))
+	asm.emit("RETURN_VALUE")
+	yield "large_constant", asm.format()
+
+LISTINGS = dict(listings())
+VARIANTS = {
+	"plain": lambda disasm: disasm,
+	"crlf": lambda disasm: disasm.replace("\n", "\r\n"),
+	"tabs": lambda disasm: re.sub(r"(?<=\S) {2,}", "\t", disasm),
+	"mutated": lambda disasm: mutate(disasm, 0),
+	"mutated_more": lambda disasm: mutate(mutate(disasm, 1), 2),
+}
+
+@pytest.mark.parametrize("variant", VARIANTS)
+@pytest.mark.parametrize("name", LISTINGS)
+def test_lexer_parity(name, variant):
+	disasm = VARIANTS[variant](LISTINGS[name])
+	expected = old_dis_to_instructions(disasm)
+	assert [instruction._fields() for instruction in dis_to_instructions(disasm)] == expected
+	assert [instruction._fields() for instruction in dis_to_instruction_table(disasm)] == expected
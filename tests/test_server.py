@@ -0,0 +1,42 @@
+""" the decompile server"""
+import asyncio
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from dis2py import decompile_all, server
+
+SAMPLE = (Path(__file__).parent.parent / "samples" / "disas.txt").read_text()
+
+def request(lines):
+	""" serves on localhost with thread workers, sends lines on one connection and returns the responses"""
+	async def run():
+		with ThreadPoolExecutor(2) as executor:
+			listener = await asyncio.start_server(server.DecompileServer(executor, 2).handle_connection, "127.0.0.1", 0)
+			async with listener:
+				reader, writer = await asyncio.open_connection(*listener.sockets[0].getsockname()[:2])
+				writer.write(b"".join(lines))
+				writer.write_eof()
+				responses = [json.loads(line) async for line in reader]
+				writer.close()
+				return responses
+	return asyncio.run(run())
+
+def test_functions_are_streamed_in_order():
+	responses = request([json.dumps({"id": 1, "disasm": SAMPLE}).encode() + b"\n", b"not json\n"])
+	functions = [(r["name"], r["code"], r["args"]) for r in responses[:-2]]
+	assert functions == list(decompile_all(SAMPLE))
+	assert responses[-2] == {"id": 1, "done": True, "functions": len(functions)}
+	assert responses[-1]["error"].startswith("bad request: ")
+
+def test_listing_is_split_off_the_event_loop(monkeypatch):
+	threads = []
+	original = server.split_funcs
+	def split_funcs(disasm):
+		for func in original(disasm):
+			threads.append(threading.current_thread())
+			yield func
+	monkeypatch.setattr(server, "split_funcs", split_funcs)
+	request([json.dumps({"disasm": SAMPLE}).encode() + b"\n"])
+	assert threads and threading.main_thread() not in threads
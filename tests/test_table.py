@@ -0,0 +1,33 @@
+""" the columnar storage of instructions"""
+from pathlib import Path
+
+from dis2py import InstructionTable, dis_to_instructions, strip_comments
+from dis2py.dis2py import dis_to_instruction_table
+
+SAMPLE = strip_comments((Path(__file__).parent.parent / "samples" / "disas.txt").read_text())
+
+def listing(opnames):
+	return "".join(f"  1 {2 * i:>12} {opname}\n" for i, opname in enumerate(opnames))
+
+def letters(i):
+	return "".join(chr(ord("A") + int(digit)) for digit in str(i))
+
+def test_same_instructions_as_a_list():
+	table = dis_to_instruction_table(SAMPLE)
+	assert list(table) == table[:] == dis_to_instructions(SAMPLE)
+	assert [row for row in table.rows()] == [
+		(instruction.offset, instruction.opname, instruction.arg, instruction.argval) for instruction in table
+	]
+
+def test_opname_codes_are_per_table():
+	for start in (0, 40000):  # more distinct opnames than fit in the opcodes of one table, over both
+		table = dis_to_instruction_table(listing(f"OP_{letters(i)}" for i in range(start, start + 40000)))
+		assert len(table.opnames) == 40000
+		assert table[-1].opname == f"OP_{letters(start + 39999)}"
+	assert dis_to_instruction_table(SAMPLE).opnames[0] == dis_to_instructions(SAMPLE)[0].opname
+
+def test_opcodes_widen_for_lots_of_opnames():
+	opnames = [f"OP_{letters(i)}" for i in range(70000)]
+	table = InstructionTable(dis_to_instructions(listing(opnames)))
+	assert table.opcodes.typecode != "H"
+	assert [instruction.opname for instruction in table] == opnames